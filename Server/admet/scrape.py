@@ -8,14 +8,19 @@ import os
 import shutil
 import re
 
-def automate_download(unique_id, smiles_code="CC(C)CO"):
+def automate_download(unique_id, smiles_code="CC(C)CO", download_dir=None):
+    """
+    Runs SwissADME for one molecule. Chrome downloads into download_dir
+    (./downloads when not given); pass a directory of its own per call, as
+    the site always names the file swissadme.csv.
+    """
     options = webdriver.ChromeOptions()
     
     options.add_argument("--start-maximized")
     options.add_argument("--headless")
     
-    current_dir = os.getcwd()
-    download_dir = os.path.join(current_dir, "downloads")
+    if download_dir is None:
+        download_dir = os.path.join(os.getcwd(), "downloads")
     
     if not os.path.exists(download_dir):
         os.makedirs(download_dir)
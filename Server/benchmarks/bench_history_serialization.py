@@ -0,0 +1,101 @@
+"""
+Compares the legacy history serialization (MessageModel(**doc) -> .dict() ->
+FastAPI's jsonable_encoder + json.dumps) against the orjson fast path used by
+/chats/{chat_id}/messages, and reports throughput in MB of history per second.
+
+Run from the Server directory:
+
+    python -m benchmarks.bench_history_serialization --messages 200 1000 5000
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+
+from models.pydantic_models import MessageModel
+from utils.fast_json import encode_messages
+
+
+def synthetic_history(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Message documents shaped like stored ones: short questions, multi-KB
+    explanations and the occasional base64 molecule image.
+    """
+    rng = random.Random(seed)
+    chat_id = str(uuid.uuid4())
+    start = datetime(2025, 1, 1)
+    image = "data:image/png;base64," + base64.b64encode(os.urandom(12000)).decode()
+    docs = []
+    for i in range(count):
+        role = "user" if i % 2 == 0 else "assistant"
+        if role == "user":
+            content = "@admet_prediction what about CC(C)Cc1ccc(cc1)C(C)C(=O)O ?"
+        else:
+            content = " ".join(rng.choice(["binding", "affinity", "solubility", "pKd", "CYP3A4", "Lipinski"])
+                               for _ in range(rng.randint(300, 900)))
+        docs.append({
+            "id": str(uuid.uuid4()),
+            "chat_id": chat_id,
+            "role": role,
+            "content": content,
+            "created_at": start + timedelta(seconds=i),
+            "ml_activated": role == "assistant" and i % 6 == 1,
+            "parameters": {"image": image} if role == "assistant" and i % 10 == 1 else {}
+        })
+    return docs
+
+
+def legacy_path(docs: List[Dict[str, Any]]) -> bytes:
+    messages = [MessageModel(**doc) for doc in docs]
+    body = jsonable_encoder({"messages": [message.dict() for message in messages]})
+    return json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(docs: List[Dict[str, Any]]) -> bytes:
+    return encode_messages(docs)
+
+
+def measure(fn: Callable[[List[Dict[str, Any]]], bytes], docs: List[Dict[str, Any]], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(docs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat history serialization.")
+    parser.add_argument("--messages", type=int, nargs="+", default=[200, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = []
+    for count in args.messages:
+        docs = synthetic_history(count)
+        legacy_payload, fast_payload = legacy_path(docs), fast_path(docs)
+        assert json.loads(legacy_payload) == json.loads(fast_payload), "fast path changed the response"
+
+        size_mb = len(fast_payload) / 1e6
+        legacy_s = measure(legacy_path, docs, args.repeat)
+        fast_s = measure(fast_path, docs, args.repeat)
+        results.append({
+            "messages": count,
+            "payload_mb": round(size_mb, 2),
+            "legacy_mb_per_s": round(size_mb / legacy_s, 1),
+            "fast_mb_per_s": round(size_mb / fast_s, 1),
+            "speedup": round(legacy_s / fast_s, 1)
+        })
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Compares sliding-window protein encoding (Plapt.encode_protein_windowed)
+with full-length ProtBert encoding on sequences short enough for both, and
+reports embedding cosine similarity, the change in predicted pKd over a set
+of ligands, encode time and attention memory.
+
+Run from the Server directory (needs the Plapt models):
+
+    python -m benchmarks.bench_protein_windows --lengths 300 600 1200 --window 256 --overlap 64
+    python -m benchmarks.bench_protein_windows --fasta targets.fasta --window 512
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import torch
+
+from binding_affinity.plapt import Plapt
+from binding_affinity.target_library import read_fasta
+
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+PROTBERT_HEADS = 16
+
+DEFAULT_LIGANDS = [
+    "CC(=O)Oc1ccccc1C(=O)O",
+    "CC1=CC=C(C=C1)C2=CC(=NN2C3=CC=C(C=C3)S(=O)(=O)N)C(F)(F)F",
+    "CN1C=NC2=C1C(=O)N(C(=O)N2C)C",
+    "CC(C)Cc1ccc(cc1)C(C)C(=O)O",
+    "COc1cc2c(Nc3ccc(Br)cc3F)ncnc2cc1OCC1CCN(C)CC1",
+]
+
+
+def synthetic_sequences(lengths: List[int], seed: int = 0) -> List[Tuple[str, str]]:
+    rng = random.Random(seed)
+    return [(f"synthetic_{length}", "".join(rng.choice(AMINO_ACIDS) for _ in range(length))) for length in lengths]
+
+
+def attention_mb(batch: int, tokens: int) -> float:
+    # One layer's attention scores in float32; the dominant transient
+    return batch * PROTBERT_HEADS * tokens * tokens * 4 / 1e6
+
+
+def timed(fn):
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+    start = time.perf_counter()
+    result = fn()
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    peak = torch.cuda.max_memory_allocated() / 1e6 if torch.cuda.is_available() else None
+    return result, time.perf_counter() - start, peak
+
+
+def full_embedding(plapt: Plapt, seq: str) -> torch.Tensor:
+    tokens = plapt.tokenize_protein([seq])
+    with torch.no_grad():
+        return plapt.prot_encoder(**tokens.to(plapt.device)).pooler_output.cpu()[0]
+
+
+def predicted_pkd(plapt: Plapt, protein: torch.Tensor, ligands: torch.Tensor) -> List[float]:
+    features = torch.cat((protein.repeat(len(ligands), 1), ligands), dim=1).numpy()
+    return [result["neg_log10_affinity_M"] for result in plapt.prediction_module.predict(features)]
+
+
+def compare(plapt: Plapt, name: str, seq: str, ligands: torch.Tensor) -> Dict[str, object]:
+    full, full_s, full_peak = timed(lambda: full_embedding(plapt, seq))
+    windowed, windowed_s, windowed_peak = timed(lambda: plapt.encode_protein_windowed(seq))
+
+    full_pkd = predicted_pkd(plapt, full, ligands)
+    windowed_pkd = predicted_pkd(plapt, windowed, ligands)
+    deltas = [abs(a - b) for a, b in zip(full_pkd, windowed_pkd)]
+    windows = plapt.protein_windows(seq)
+
+    return {
+        "target": name,
+        "length": len(seq),
+        "windows": len(windows),
+        "cosine": round(float(torch.nn.functional.cosine_similarity(full, windowed, dim=0)), 4),
+        "mean_abs_delta_pkd": round(sum(deltas) / len(deltas), 3),
+        "max_abs_delta_pkd": round(max(deltas), 3),
+        "full_s": round(full_s, 3),
+        "windowed_s": round(windowed_s, 3),
+        "full_attention_mb": round(attention_mb(1, len(seq) + 2), 1),
+        "windowed_attention_mb": round(attention_mb(min(len(windows), plapt.protein_window_batch), plapt.protein_window), 1),
+        "full_peak_mb": full_peak,
+        "windowed_peak_mb": windowed_peak
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare windowed and full-length protein encoding.")
+    parser.add_argument("--fasta", help="targets to compare; synthetic sequences when omitted")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[300, 600, 1200, 2400])
+    parser.add_argument("--window", type=int, default=512, help="tokens per window")
+    parser.add_argument("--overlap", type=int, default=128)
+    parser.add_argument("--window-batch", type=int, default=4)
+    parser.add_argument("--ligands", nargs="+", default=DEFAULT_LIGANDS)
+    args = parser.parse_args()
+
+    targets = [(header.split()[0], seq) for header, seq in read_fasta(args.fasta)] if args.fasta else synthetic_sequences(args.lengths)
+    # Only sequences full-length encoding handles without truncation
+    targets = [(name, seq) for name, seq in targets if len(seq) <= 3198]
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        plapt = Plapt(
+            cache_dir=cache_dir,
+            protein_window=args.window,
+            protein_window_overlap=args.overlap,
+            protein_window_batch=args.window_batch
+        )
+        ligands = plapt.encode_molecules(args.ligands, batch_size=16).cpu()
+        results = [compare(plapt, name, seq, ligands) for name, seq in targets]
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Measures the memory held per ChatSession at various history lengths and
+compares it with the previous plain-object session (unbounded history list,
+eagerly allocated dicts, unbounded inference cache).
+
+Run from the Server directory:
+
+    python -m benchmarks.bench_session_memory --history 0 4 20 100 --sessions 2000
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from services.chat_session import ChatSession
+
+
+class LegacyChatSession:
+    """The session as it was before __slots__ and the bounded buffers."""
+    def __init__(self):
+        self.parameters: Dict[str, Any] = {}
+        self.ml_activated: bool = False
+        self.inference_cache: Dict[Tuple, Any] = {}
+        self.parameter_timestamps: Dict[str, float] = {}
+        self.chat_history: List[Dict[str, str]] = []
+
+    def update_parameter(self, param_name: str, value: Any) -> None:
+        self.parameters[param_name] = value
+        self.parameter_timestamps[param_name] = time.time()
+
+    def cache_result(self, result: Any) -> None:
+        self.inference_cache[tuple(sorted(self.parameters.items()))] = result
+
+    def add_message(self, message: Dict[str, str]) -> None:
+        self.chat_history.append(message)
+
+
+def build_session(factory: Callable[[], Any], history: int, index: int, with_results: bool) -> Any:
+    session = factory()
+    for i in range(history):
+        role = "user" if i % 2 == 0 else "assistant"
+        # Distinct strings, as real messages are; ~300 characters each
+        session.add_message({"role": role, "content": f"{index}:{i} " + "binding affinity of the ligand " * 10})
+    if with_results:
+        for i in range(history // 2):
+            session.update_parameter("A", f"MKTVRQERLK{index}:{i}")
+            session.update_parameter("B", f"CC(=O)Oc1ccccc1C(=O)O.{i}")
+            if isinstance(session, LegacyChatSession):
+                # ChatSession leaves results to the shared inference cache
+                session.cache_result(f"pKd {i}")
+    return session
+
+
+def bytes_per_session(factory: Callable[[], Any], history: int, sessions: int, with_results: bool) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = [build_session(factory, history, index, with_results) for index in range(sessions)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return (after - before) // sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ChatSession memory footprint.")
+    parser.add_argument("--history", type=int, nargs="+", default=[0, 4, 20, 100])
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--with-results", action="store_true", help="also set parameters every other turn (and cache a result in the legacy session)")
+    args = parser.parse_args()
+
+    results = []
+    for history in args.history:
+        legacy = bytes_per_session(LegacyChatSession, history, args.sessions, args.with_results)
+        compact = bytes_per_session(ChatSession, history, args.sessions, args.with_results)
+        results.append({
+            "history": history,
+            "legacy_bytes_per_session": legacy,
+            "compact_bytes_per_session": compact,
+            "compact_approx_size": build_session(ChatSession, history, 0, args.with_results).approx_size(),
+            "ratio": round(legacy / compact, 2)
+        })
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
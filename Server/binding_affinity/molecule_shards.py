@@ -0,0 +1,219 @@
+"""
+Pre-tokenized molecule libraries, for screening the same compounds against
+many targets without running the ChemBERTa tokenizer each time.
+
+Building canonicalizes every SMILES with RDKit as the server does before
+scoring, drops the ones that do not parse, tokenizes the rest once and
+writes shards of token ids and lengths, bucketed by length and sorted within
+each shard, so a batch read from a shard needs almost no padding.
+Plapt.score_molecule_library reads the shards through memory maps; only the
+batch being encoded is ever copied.
+
+Run from the Server directory:
+
+    python -m binding_affinity.molecule_shards build library.smi --out library_shards
+    python -m binding_affinity.molecule_shards screen library_shards --target MKTVRQ... --top-k 100
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from utils.chem_utils import canonicalize_batch, parse_smiles_lines
+
+MOL_TOKENIZER = "seyonec/ChemBERTa-zinc-base-v1"
+MOL_MAX_LENGTH = 278  # Plapt.tokenize_molecule truncates here
+DEFAULT_BUCKETS = [32, 48, 64, 96, 128, 192, MOL_MAX_LENGTH]
+MANIFEST_FILE = "manifest.json"
+SMILES_FILE = "smiles.txt"
+FORMAT_VERSION = 1
+
+
+class ShardWriter:
+    """
+    Collects tokenized molecules per length bucket and writes a shard file
+    set (tokens, lengths, library rows) whenever a bucket fills up.
+    """
+    def __init__(self, out: str, buckets: List[int], shard_size: int, pad_token_id: int, dtype: np.dtype):
+        self.out = out
+        self.buckets = buckets
+        self.shard_size = shard_size
+        self.pad_token_id = pad_token_id
+        self.dtype = dtype
+        self.pending: Dict[int, List[Tuple[int, List[int]]]] = {width: [] for width in buckets}
+        self.shards: List[Dict[str, Any]] = []
+
+    def add(self, row: int, ids: List[int]) -> None:
+        width = next(width for width in self.buckets if len(ids) <= width)
+        self.pending[width].append((row, ids))
+        if len(self.pending[width]) >= self.shard_size:
+            self.flush(width)
+
+    def flush(self, width: int) -> None:
+        items = sorted(self.pending[width], key=lambda item: len(item[1]))
+        self.pending[width] = []
+        if not items:
+            return
+        tokens = np.full((len(items), width), self.pad_token_id, dtype=self.dtype)
+        lengths = np.empty(len(items), dtype=np.uint16)
+        rows = np.empty(len(items), dtype=np.int64)
+        for i, (row, ids) in enumerate(items):
+            tokens[i, :len(ids)] = ids
+            lengths[i] = len(ids)
+            rows[i] = row
+
+        name = f"b{width}-{sum(shard['width'] == width for shard in self.shards):05d}"
+        for suffix, array in (("tokens", tokens), ("lengths", lengths), ("rows", rows)):
+            np.save(os.path.join(self.out, f"{name}.{suffix}.npy"), array)
+        self.shards.append({"name": name, "width": width, "count": len(items)})
+
+    def close(self) -> None:
+        for width in self.buckets:
+            self.flush(width)
+
+
+def build_shards(smiles_path: str, out: str, buckets: List[int] = DEFAULT_BUCKETS, shard_size: int = 262144, chunk_size: int = 10000, processes: int = 0) -> Dict[str, Any]:
+    """
+    Tokenizes the canonical form of every valid SMILES of a file with
+    Plapt's molecule tokenizer into shards under out, replacing any library
+    already there only once the new one is complete. `processes` > 1
+    canonicalizes large chunks in a process pool.
+    """
+    from transformers import RobertaTokenizer
+
+    tokenizer = RobertaTokenizer.from_pretrained(MOL_TOKENIZER)
+    buckets = sorted(set(min(width, MOL_MAX_LENGTH) for width in buckets) | {MOL_MAX_LENGTH})
+    dtype = np.uint16 if len(tokenizer) <= np.iinfo(np.uint16).max else np.int32
+
+    parent = os.path.dirname(os.path.abspath(out))
+    staging = tempfile.mkdtemp(prefix=".molecule_shards-", dir=parent)
+    writer = ShardWriter(staging, buckets, shard_size, tokenizer.pad_token_id, dtype)
+
+    count = invalid = 0
+    with open(smiles_path) as smiles_in, open(os.path.join(staging, SMILES_FILE), "w") as smiles_out:
+        chunk: List[str] = []
+        for smiles in parse_smiles_lines(smiles_in):
+            chunk.append(smiles)
+            if len(chunk) == chunk_size:
+                count, invalid = _tokenize_chunk(tokenizer, chunk, count, invalid, writer, smiles_out, processes)
+                chunk = []
+        if chunk:
+            count, invalid = _tokenize_chunk(tokenizer, chunk, count, invalid, writer, smiles_out, processes)
+    writer.close()
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "tokenizer": MOL_TOKENIZER,
+        "max_length": MOL_MAX_LENGTH,
+        "pad_token_id": tokenizer.pad_token_id,
+        "dtype": np.dtype(dtype).name,
+        "count": count,
+        "invalid": invalid,
+        "buckets": buckets,
+        "shards": writer.shards
+    }
+    with open(os.path.join(staging, MANIFEST_FILE), "w") as handle:
+        json.dump(manifest, handle, indent=2)
+    if os.path.exists(out):
+        shutil.rmtree(out)
+    os.replace(staging, out)
+    return {
+        "molecules": count,
+        "invalid": invalid,
+        "shards": len(writer.shards),
+        "buckets": {str(width): sum(s["count"] for s in writer.shards if s["width"] == width) for width in buckets}
+    }
+
+
+def _tokenize_chunk(tokenizer: Any, chunk: List[str], first_row: int, invalid: int, writer: ShardWriter, smiles_out, processes: int) -> Tuple[int, int]:
+    # Same canonical form as /screen and the chat path, so a molecule gets
+    # the same tokens (and score) however it was written in the file
+    canonical = [record.smiles for record in canonicalize_batch(chunk, processes) if record is not None]
+    invalid += len(chunk) - len(canonical)
+    if not canonical:
+        return first_row, invalid
+    encoded = tokenizer(canonical, truncation=True, max_length=MOL_MAX_LENGTH)["input_ids"]
+    for offset, (smiles, ids) in enumerate(zip(canonical, encoded)):
+        writer.add(first_row + offset, ids)
+        smiles_out.write(smiles + "\n")
+    return first_row + len(canonical), invalid
+
+
+class MoleculeLibrary:
+    """
+    Read-only view of built shards. Token, length and row arrays are
+    memory-mapped; batches() yields views into them without copying.
+    """
+    def __init__(self, path: str):
+        with open(os.path.join(path, MANIFEST_FILE)) as handle:
+            self.manifest = json.load(handle)
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported molecule library format in {path}")
+        self.path = path
+        self.tokenizer = self.manifest["tokenizer"]
+        self.pad_token_id = self.manifest["pad_token_id"]
+        self.shards = [
+            tuple(
+                np.load(os.path.join(path, f"{shard['name']}.{suffix}.npy"), mmap_mode="r")
+                for suffix in ("tokens", "lengths", "rows")
+            )
+            for shard in self.manifest["shards"]
+        ]
+
+    def __len__(self) -> int:
+        return self.manifest["count"]
+
+    def batches(self, batch_size: int) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        (tokens, lengths, rows) per batch, in shard order; tokens are
+        trimmed to the longest molecule of the batch.
+        """
+        for tokens, lengths, rows in self.shards:
+            for start in range(0, len(rows), batch_size):
+                batch_lengths = lengths[start:start + batch_size]
+                yield tokens[start:start + batch_size, :int(batch_lengths.max())], batch_lengths, rows[start:start + batch_size]
+
+    def smiles(self) -> List[str]:
+        with open(os.path.join(self.path, SMILES_FILE)) as handle:
+            return [line.rstrip("\n") for line in handle]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or screen a pre-tokenized molecule library.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="tokenize a SMILES file into shards")
+    build.add_argument("smiles")
+    build.add_argument("--out", default="molecule_shards")
+    build.add_argument("--buckets", type=int, nargs="+", default=DEFAULT_BUCKETS, help="upper token lengths of the buckets")
+    build.add_argument("--shard-size", type=int, default=262144, help="molecules per shard file")
+    build.add_argument("--processes", type=int, default=0, help="worker processes for canonicalizing SMILES")
+
+    screen = commands.add_parser("screen", help="score a built library against one target")
+    screen.add_argument("library")
+    screen.add_argument("--target", required=True)
+    screen.add_argument("--top-k", type=int, default=100)
+    screen.add_argument("--batch-size", type=int, default=64)
+    screen.add_argument("--device", default="cuda")
+    screen.add_argument("--target-library", default=None, help="precomputed target embeddings (target_library.py)")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(json.dumps(build_shards(args.smiles, args.out, args.buckets, args.shard_size, processes=args.processes), indent=2))
+        return
+
+    from binding_affinity.plapt import Plapt
+    library = MoleculeLibrary(args.library)
+    plapt = Plapt(device=args.device, target_library=args.target_library)
+    results = plapt.score_molecule_library(args.target, library, mol_batch_size=args.batch_size)
+    smiles = library.smiles()
+    ranked = sorted(range(len(results)), key=lambda row: results[row]["neg_log10_affinity_M"], reverse=True)
+    print(json.dumps([{"smiles": smiles[row], **results[row]} for row in ranked[:args.top_k]], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ from transformers import BertTokenizer, BertModel, RobertaTokenizer, RobertaMode
 import re
 import onnxruntime
 import numpy as np
-from typing import List, Dict, Union
+from typing import List, Dict, Optional, Union
 from diskcache import Cache
 from tqdm import tqdm
 from contextlib import contextmanager, nullcontext
@@ -31,10 +31,23 @@ class PredictionModule:
         return affinities
 
 class Plapt:
-    def __init__(self, prediction_module_path: str = "binding_affinity/models/affinity_predictor.onnx", device: str = 'cuda', cache_dir: str = './embedding_cache', use_tqdm: bool = False):
+    def __init__(self, prediction_module_path: str = "binding_affinity/models/affinity_predictor.onnx", device: str = 'cuda', cache_dir: str = './embedding_cache', use_tqdm: bool = False,
+                 protein_window: Optional[int] = None, protein_window_overlap: int = 128, protein_window_batch: int = 4,
+                 target_library: Optional[str] = None):
         self.device = torch.device(device if torch.cuda.is_available() else 'cpu')
         self.use_tqdm = use_tqdm
         
+        # Opt-in sliding-window encoding: sequences longer than protein_window
+        # tokens are encoded as overlapping windows, protein_window_batch at a
+        # time, so peak attention memory is bounded by
+        # protein_window_batch * protein_window^2 instead of growing with the
+        # sequence up to the 3200-token truncation.
+        if protein_window is not None and protein_window - 2 <= protein_window_overlap:
+            raise ValueError("protein_window must exceed protein_window_overlap + 2.")
+        self.protein_window = protein_window
+        self.protein_window_overlap = protein_window_overlap
+        self.protein_window_batch = protein_window_batch
+        
         self.prot_tokenizer = BertTokenizer.from_pretrained("Rostlab/prot_bert", do_lower_case=False)
         self.prot_encoder = BertModel.from_pretrained("Rostlab/prot_bert").to(self.device)
         
@@ -43,6 +56,13 @@ class Plapt:
         
         self.prediction_module = PredictionModule(prediction_module_path)
         self.cache = Cache(cache_dir)
+        
+        # Memory-mapped embeddings of known targets (see target_library.py);
+        # those targets never reach the protein encoder
+        self.target_library = None
+        if target_library is not None:
+            from binding_affinity.target_library import TargetLibrary
+            self.target_library = TargetLibrary(target_library)
 
     @contextmanager
     def progress_bar(self, total: int, desc: str):
@@ -85,13 +105,73 @@ class Plapt:
         
         return torch.stack(embeddings).to(self.device)
 
+    def encode_token_batch(self, tokens: np.ndarray, lengths: np.ndarray) -> torch.Tensor:
+        # Token ids as written by molecule_shards.py, already padded with the
+        # tokenizer's pad id; only this batch is copied out of the memory map
+        input_ids = torch.from_numpy(tokens.astype(np.int64))
+        attention_mask = (torch.arange(tokens.shape[1])[None, :] < torch.from_numpy(lengths.astype(np.int64))[:, None]).long()
+        with torch.no_grad():
+            return self.mol_encoder(input_ids=input_ids.to(self.device), attention_mask=attention_mask.to(self.device)).pooler_output
+
+    def protein_windows(self, seq: str) -> List[str]:
+        residues = re.sub(r"[UZOB]", "X", seq)
+        window = self.protein_window - 2  # room for [CLS] and [SEP]
+        if len(residues) <= window:
+            return [residues]
+        stride = window - self.protein_window_overlap
+        starts = list(range(0, len(residues) - window, stride)) + [len(residues) - window]
+        return [residues[start:start + window] for start in starts]
+
+    def encode_protein_windowed(self, seq: str) -> torch.Tensor:
+        # Window embeddings pooled into one vector, weighted by window length
+        pooled = None
+        total = 0
+        for batch in self.make_batches(self.protein_windows(seq), self.protein_window_batch):
+            tokens = self.prot_tokenizer([" ".join(window) for window in batch], padding=True, return_tensors='pt')
+            with torch.no_grad():
+                window_embeddings = self.prot_encoder(**tokens.to(self.device)).pooler_output.cpu()
+            weights = torch.tensor([len(window) for window in batch], dtype=window_embeddings.dtype)
+            weighted = (window_embeddings * weights[:, None]).sum(dim=0)
+            pooled = weighted if pooled is None else pooled + weighted
+            total += int(weights.sum())
+        return pooled / total
+
+    def uses_windows(self, seq: str) -> bool:
+        return self.protein_window is not None and len(seq) > self.protein_window - 2
+
+    def protein_encoding(self, seq: str) -> str:
+        # Full-length embeddings of long sequences (truncated at 3200 tokens)
+        # and windowed ones must not be served for each other
+        if not self.uses_windows(seq):
+            return "full"
+        return f"window{self.protein_window}/{self.protein_window_overlap}"
+
+    def protein_cache_key(self, seq: str) -> str:
+        if not self.uses_windows(seq):
+            return seq
+        return f"{self.protein_encoding(seq)}:{seq}"
+
+    def cached_protein_embedding(self, seq: str) -> Optional[torch.Tensor]:
+        if self.target_library is not None:
+            embedding = self.target_library.lookup(seq, self.protein_encoding(seq))
+            if embedding is not None:
+                return torch.from_numpy(np.array(embedding))
+        return self.cache.get(self.protein_cache_key(seq))
+
     def encode_proteins(self, prot_seqs: List[str], batch_size: int) -> torch.Tensor:
         embeddings = []
         with self.progress_bar(len(prot_seqs), "Encoding proteins") as pbar:
             for batch in self.make_batches(prot_seqs, batch_size):
-                cached_embeddings = [self.cache.get(seq) for seq in batch]
+                cached_embeddings = [self.cached_protein_embedding(seq) for seq in batch]
                 uncached_indices = [i for i, emb in enumerate(cached_embeddings) if emb is None]
                 
+                # Long sequences are encoded on their own, window by window
+                if self.protein_window is not None:
+                    for i in [i for i in uncached_indices if self.uses_windows(batch[i])]:
+                        cached_embeddings[i] = self.encode_protein_windowed(batch[i])
+                        self.cache[self.protein_cache_key(batch[i])] = cached_embeddings[i]
+                    uncached_indices = [i for i in uncached_indices if cached_embeddings[i] is None]
+                
                 if uncached_indices:
                     uncached_seqs = [batch[i] for i in uncached_indices]
                     tokens = self.tokenize_protein(uncached_seqs)
@@ -99,7 +179,7 @@ class Plapt:
                         new_embeddings = self.prot_encoder(**tokens.to(self.device)).pooler_output.cpu()
                     for i, emb in zip(uncached_indices, new_embeddings):
                         cached_embeddings[i] = emb
-                        self.cache[batch[i]] = emb
+                        self.cache[self.protein_cache_key(batch[i])] = emb
                 
                 embeddings.extend(cached_embeddings)
                 if self.use_tqdm:
@@ -149,6 +229,30 @@ class Plapt:
                     pbar.update(len(batch))
 
         return affinities
+
+    def score_molecule_library(self, target_protein: str, library, mol_batch_size: int = 64) -> List[Dict[str, float]]:
+        """
+        Scores every molecule of a pre-tokenized library (a
+        molecule_shards.MoleculeLibrary) against one target, skipping the
+        tokenizer and the per-SMILES embedding cache. Results are in library
+        row order.
+        """
+        if library.tokenizer != self.mol_tokenizer.name_or_path or library.pad_token_id != self.mol_tokenizer.pad_token_id:
+            raise ValueError(f"{library.path} was tokenized with {library.tokenizer}, not {self.mol_tokenizer.name_or_path}.")
+        
+        target_encoding = self.encode_proteins([target_protein], batch_size=1)
+        affinities: List[Optional[Dict[str, float]]] = [None] * len(library)
+        with self.progress_bar(len(library), "Scoring library") as pbar:
+            for tokens, lengths, rows in library.batches(mol_batch_size):
+                mol_batch = self.encode_token_batch(tokens, lengths)
+                repeated_target = target_encoding.repeat(len(rows), 1)
+                features = torch.cat((repeated_target, mol_batch), dim=1).cpu().numpy()
+                for row, affinity in zip(rows, self.prediction_module.predict(features)):
+                    affinities[int(row)] = affinity
+                if self.use_tqdm:
+                    pbar.update(len(rows))
+        
+        return affinities
     
 if __name__ == "__main__":
     plapt = Plapt()
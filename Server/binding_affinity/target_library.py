@@ -0,0 +1,190 @@
+"""
+Precomputed ProtBert embeddings of known targets, so scoring against them
+never runs the protein encoder online.
+
+A library is a directory holding embeddings.npy (float32, one row per
+distinct sequence, memory-mapped at load) and index.json (accession, name,
+sequence hash, encoding and row of every FASTA record). Build it offline
+from the Server directory with the same window settings the server uses:
+
+    python -m binding_affinity.target_library build targets.fasta more.fasta --out target_library
+    python -m binding_affinity.target_library build targets.fasta --out target_library --window 512 --overlap 128
+    python -m binding_affinity.target_library list target_library
+
+and point PLAPT_TARGET_LIBRARY at the directory.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+EMBEDDINGS_FILE = "embeddings.npy"
+INDEX_FILE = "index.json"
+FORMAT_VERSION = 1
+
+
+def normalize_sequence(seq: str) -> str:
+    return "".join(seq.split()).upper()
+
+
+def sequence_hash(seq: str) -> str:
+    return hashlib.sha256(normalize_sequence(seq).encode()).hexdigest()
+
+
+def parse_accession(header: str) -> Tuple[str, str]:
+    """
+    (accession, name) of a FASTA header; UniProt headers ("sp|P00533|EGFR_HUMAN ...")
+    yield the accession and entry name, others their first word twice.
+    """
+    word = header.split()[0] if header.split() else header
+    parts = word.split("|")
+    if len(parts) >= 3 and parts[0] in ("sp", "tr"):
+        return parts[1], parts[2]
+    return word, word
+
+
+def read_fasta(path: str) -> List[Tuple[str, str]]:
+    records = []
+    header, parts = None, []
+    with open(path) as handle:
+        for line in handle:
+            line = line.strip()
+            if line.startswith(">"):
+                if header is not None:
+                    records.append((header, "".join(parts)))
+                header, parts = line[1:], []
+            elif line:
+                parts.append(line)
+    if header is not None:
+        records.append((header, "".join(parts)))
+    return records
+
+
+class TargetLibrary:
+    """
+    Read-only view of a built library. The embedding matrix is memory-mapped,
+    so worker processes share its pages and loading costs no copy.
+    """
+    def __init__(self, path: str):
+        with open(os.path.join(path, INDEX_FILE)) as handle:
+            index = json.load(handle)
+        if index.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported target library format in {path}")
+        self.path = path
+        self.model = index.get("model")
+        self.embeddings = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r")
+        self.entries: List[Dict[str, Any]] = index["entries"]
+        # (encoding, sequence hash) -> row; accession -> entry
+        self._rows = {(entry["encoding"], entry["sha256"]): entry["row"] for entry in self.entries}
+        self._accessions = {entry["accession"]: entry for entry in self.entries}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, seq: str, encoding: str = "full") -> Optional[np.ndarray]:
+        """
+        The stored embedding of a sequence encoded the given way ("full" or
+        "window{W}/{overlap}"), or None.
+        """
+        row = self._rows.get((encoding, sequence_hash(seq)))
+        return None if row is None else self.embeddings[row]
+
+    def by_accession(self, accession: str) -> Optional[Dict[str, Any]]:
+        return self._accessions.get(accession)
+
+
+def build_library(plapt: Any, fasta_paths: List[str], out: str, batch_size: int = 4) -> Dict[str, Any]:
+    """
+    Encodes every distinct sequence of the FASTA files once with
+    plapt.encode_proteins and writes the library to out, replacing any
+    library already there only once the new one is complete.
+    """
+    entries, sequences, rows = [], [], {}
+    for path in fasta_paths:
+        for header, seq in read_fasta(path):
+            seq = normalize_sequence(seq)
+            if not seq:
+                continue
+            digest = sequence_hash(seq)
+            if digest not in rows:
+                rows[digest] = len(sequences)
+                sequences.append(seq)
+            accession, name = parse_accession(header)
+            entries.append({
+                "accession": accession,
+                "name": name,
+                "sha256": digest,
+                "length": len(seq),
+                "encoding": protein_encoding(plapt, seq),
+                "row": rows[digest]
+            })
+
+    encoded = plapt.encode_proteins(sequences, batch_size)
+    embeddings = encoded.detach().cpu().numpy() if hasattr(encoded, "detach") else np.asarray(encoded)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    parent = os.path.dirname(os.path.abspath(out))
+    staging = tempfile.mkdtemp(prefix=".target_library-", dir=parent)
+    np.save(os.path.join(staging, EMBEDDINGS_FILE), embeddings)
+    index = {
+        "format": FORMAT_VERSION,
+        "model": "Rostlab/prot_bert",
+        "dim": int(embeddings.shape[1]),
+        "sequences": len(sequences),
+        "entries": entries
+    }
+    with open(os.path.join(staging, INDEX_FILE), "w") as handle:
+        json.dump(index, handle)
+    if os.path.exists(out):
+        shutil.rmtree(out)
+    os.replace(staging, out)
+    return {"entries": len(entries), "sequences": len(sequences), "dim": index["dim"], "bytes": embeddings.nbytes}
+
+
+def protein_encoding(plapt: Any, seq: str) -> str:
+    encoding = getattr(plapt, "protein_encoding", None)
+    return encoding(seq) if encoding is not None else "full"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect a precomputed target-embedding library.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="encode the targets of FASTA files")
+    build.add_argument("fasta", nargs="+")
+    build.add_argument("--out", default="target_library")
+    build.add_argument("--batch-size", type=int, default=4)
+    build.add_argument("--window", type=int, default=None, help="as PLAPT_PROTEIN_WINDOW on the server")
+    build.add_argument("--overlap", type=int, default=128, help="as PLAPT_PROTEIN_WINDOW_OVERLAP on the server")
+    build.add_argument("--window-batch", type=int, default=4)
+    build.add_argument("--device", default="cuda")
+
+    show = commands.add_parser("list", help="print the entries of a library")
+    show.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        library = TargetLibrary(args.path)
+        for entry in library.entries:
+            print(f"{entry['accession']}\t{entry['name']}\t{entry['length']}\t{entry['encoding']}\t{entry['sha256'][:12]}")
+        return
+
+    from binding_affinity.plapt import Plapt
+    with tempfile.TemporaryDirectory() as cache_dir:
+        plapt = Plapt(
+            device=args.device,
+            cache_dir=cache_dir,
+            protein_window=args.window,
+            protein_window_overlap=args.overlap,
+            protein_window_batch=args.window_batch
+        )
+        print(json.dumps(build_library(plapt, args.fasta, args.out, args.batch_size), indent=2))
+
+
+if __name__ == "__main__":
+    main()
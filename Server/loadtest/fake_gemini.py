@@ -0,0 +1,170 @@
+"""
+Local stand-in for the Gemini generateContent API, for deterministic load
+testing of the server without touching the real quota.
+
+Run from the Server directory:
+
+    python -m loadtest.fake_gemini --port 8089 --latency-ms 300 --rpm 120
+
+and start the API with GEMINI_BASE_URL=http://localhost:8089 and any
+non-empty GEMINI_API_KEY.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import random
+import re
+import time
+from typing import Any, Deque, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import uvicorn
+
+SAMPLE_PROTEIN = "MKTVRQERLKSIVRILERSKEPVSGAQLAEELSVSRQVIVQDIAYLRSLGYNIVATPRGYVLAGG"
+SAMPLE_SMILES = "CC1=CC=C(C=C1)C2=CC(=NN2C3=CC=C(C=C3)S(=O)(=O)N)C(F)(F)F"
+
+
+class FakeGeminiConfig:
+    def __init__(
+        self,
+        latency_ms: float = 200.0,
+        jitter_ms: float = 50.0,
+        requests_per_minute: Optional[int] = None,
+        fail_every: int = 0,
+        server_error_every: int = 0,
+        seed: int = 0
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.requests_per_minute = requests_per_minute
+        self.fail_every = fail_every
+        self.server_error_every = server_error_every
+        self.seed = seed
+
+
+def canned_reply(prompt: str) -> str:
+    """
+    Returns a response shaped like what the server's prompts expect, so the
+    extraction and summary parsers exercise their normal code paths.
+    """
+    if '"protein_sequence"' in prompt:
+        smiles = _first_smiles(prompt) or SAMPLE_SMILES
+        protein = _first_protein(prompt) or SAMPLE_PROTEIN
+        return json.dumps({"protein_sequence": protein, "smiles": smiles})
+    if '"smiles": [' in prompt:
+        smiles = _first_smiles(prompt) or SAMPLE_SMILES
+        return json.dumps({"smiles": [smiles]})
+    if 'TITLE: ' in prompt:
+        return "TITLE: Notes From a Drug Discovery Conversation\n\n" + _filler(prompt, 400)
+    return _filler(prompt, 120)
+
+
+def _first_smiles(prompt: str) -> Optional[str]:
+    message = prompt.split("User message:", 1)[-1]
+    for token in message.split():
+        if re.fullmatch(r"[A-Za-z0-9@+\-\[\]\(\)=#$/\\%.]{3,}", token) and re.search(r"[=()#\[\]]|^C", token):
+            return token
+    return None
+
+
+def _first_protein(prompt: str) -> Optional[str]:
+    message = prompt.split("User message:", 1)[-1]
+    match = re.search(r"\b[ACDEFGHIKLMNPQRSTVWY]{20,}\b", message)
+    return match.group(0) if match else None
+
+
+def _filler(prompt: str, words: int) -> str:
+    rng = random.Random(len(prompt))
+    vocabulary = ["binding", "affinity", "ligand", "assay", "solubility", "toxicity", "target",
+                  "kinase", "selectivity", "scaffold", "potency", "clearance", "permeability"]
+    return " ".join(rng.choice(vocabulary) for _ in range(words)).capitalize() + "."
+
+
+def create_app(config: FakeGeminiConfig) -> FastAPI:
+    app = FastAPI(title="Fake Gemini")
+    rng = random.Random(config.seed)
+    recent: Deque[float] = collections.deque()
+    counters = {"requests": 0}
+
+    @app.post("/{api_version}/models/{model_action}")
+    async def generate_content(api_version: str, model_action: str, request: Request):
+        body: Dict[str, Any] = await request.json()
+        counters["requests"] += 1
+        count = counters["requests"]
+
+        now = time.monotonic()
+        while recent and now - recent[0] > 60:
+            recent.popleft()
+        if config.requests_per_minute and len(recent) >= config.requests_per_minute:
+            return _error(429, "RESOURCE_EXHAUSTED", "Quota exceeded for requests per minute.")
+        recent.append(now)
+
+        if config.fail_every and count % config.fail_every == 0:
+            return _error(429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (e.g. check quota).")
+        if config.server_error_every and count % config.server_error_every == 0:
+            return _error(503, "UNAVAILABLE", "The model is overloaded. Please try again later.")
+
+        delay = max(0.0, config.latency_ms + rng.uniform(-config.jitter_ms, config.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+
+        prompt = "".join(
+            part.get("text", "")
+            for content in body.get("contents", [])
+            for part in content.get("parts", [])
+        )
+        text = canned_reply(prompt)
+        return {
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": text}]},
+                "finishReason": "STOP",
+                "index": 0
+            }],
+            "usageMetadata": {
+                "promptTokenCount": len(prompt) // 4,
+                "candidatesTokenCount": len(text) // 4,
+                "totalTokenCount": (len(prompt) + len(text)) // 4
+            },
+            "modelVersion": model_action.split(":", 1)[0]
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": counters["requests"], "requests_last_minute": len(recent)}
+
+    return app
+
+
+def _error(code: int, status: str, message: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=code,
+        content={"error": {"code": code, "message": message, "status": status}}
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake Gemini API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Uniform jitter around the mean latency")
+    parser.add_argument("--rpm", type=int, default=None, help="Answer 429 above this many requests per minute")
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer every Nth request with 429")
+    parser.add_argument("--server-error-every", type=int, default=0, help="Answer every Nth request with 503")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = FakeGeminiConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        requests_per_minute=args.rpm,
+        fail_every=args.fail_every,
+        server_error_every=args.server_error_every,
+        seed=args.seed
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
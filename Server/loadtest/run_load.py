@@ -0,0 +1,346 @@
+"""
+Drives a weighted mix of chat traffic at a fixed concurrency and reports
+throughput and latency percentiles per endpoint as JSON.
+
+By default the app runs in this process behind the stand-ins of
+loadtest.standins (fake Gemini, in-memory Mongo, stub ADMET, tiny Plapt).
+Client and server then share one event loop, which is fine for comparing
+builds; for capacity numbers run the server on its own with
+loadtest.serve and point --base-url at it.
+
+Run from the Server directory:
+
+    python -m loadtest.run_load --concurrency 32 --duration 60 --output report.json
+    python -m loadtest.run_load --mix chat=70,admet=5,binding=10,messages=10,summary=2,create=3
+    python -m loadtest.serve --port 8000 --gemini-latency-ms 800 &
+    python -m loadtest.run_load --base-url http://127.0.0.1:8000 --concurrency 64
+
+The server's own Gemini limits (GEMINI_REQUESTS_PER_MINUTE,
+GEMINI_MAX_CONCURRENCY) still apply and usually bound /chat throughput;
+set them to the quota being sized for.
+
+Each virtual user keeps its own cookie jar (so its own chat session),
+starts a chat, and then loops over the mix with an optional think time.
+
+In process, exceptions raised by the app and errors it logs (including
+those of background tasks such as write-behind flushes) are listed under
+"server_errors", and the run exits with status 1 if there are any.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from loadtest import standins
+
+DEFAULT_MIX = "chat=60,admet=5,binding=10,messages=15,summary=3,create=7"
+
+PROTEINS = [
+    "MKTVRQERLKSIVRILERSKEPVSGAQLAEELSVSRQVIVQDIAYLRSLGYNIVATPRGYVLAGG",
+    "PQITLWQRPLVTIKIGGQLKEALLDTGADDTVLEEMNLPGRWKPKMIGGIGGFIKVRQYDQILIEICGHKAIGTVLVGPTPVNIIGRNLLTQIGCTLNF",
+    "MTEYKLVVVGAGGVGKSALTIQLIQNHFVDEYDPTIEDSYRKQVVIDGETCLLDILDTAGQEEYSAMRDQYMRTGEGFLCVFAINNTKSFEDIHQYREQIKRVKDSDDVPMVLVGNKCDLAARTVESRQAQDLARSYGIPYIETSAKTRQGVEDAFYTLVREIRQH",
+]
+SMILES = [
+    "CC(=O)Oc1ccccc1C(=O)O",
+    "CC(C)Cc1ccc(cc1)C(C)C(=O)O",
+    "CN1C=NC2=C1C(=O)N(C(=O)N2C)C",
+    "CC1=CC=C(C=C1)C2=CC(=NN2C3=CC=C(C=C3)S(=O)(=O)N)C(F)(F)F",
+    "COc1cc2c(Nc3ccc(Br)cc3F)ncnc2cc1OCC1CCN(C)CC1",
+    "CC(=O)Nc1ccc(O)cc1",
+    "OC(=O)c1ccccc1O",
+    "CN(C)C(=N)NC(=N)N",
+    "c1ccc2c(c1)cc1ccc3cccc4ccc2c1c34",
+    "CC12CCC3C(CCC4=CC(=O)CCC34C)C1CCC2O",
+]
+QUESTIONS = [
+    "What makes a kinase inhibitor selective?",
+    "How do I improve the solubility of a lead compound?",
+    "Explain Lipinski's rule of five.",
+    "What is the difference between IC50 and Kd?",
+    "Which assays should I run to check hERG liability?",
+    "How does fragment-based drug design work?",
+]
+
+# Report labels; path templates rather than concrete ids
+LABELS = {
+    "create": "POST /chats",
+    "chat": "POST /chat (plain)",
+    "admet": "POST /chat (admet)",
+    "binding": "POST /chat (binding)",
+    "messages": "GET /chats/{chat_id}/messages",
+    "summary": "GET /chats/{chat_id}/summary",
+}
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in LABELS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}; expected one of {', '.join(LABELS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(ordered: List[float], q: float) -> Optional[float]:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not ordered:
+        return None
+    rank = max(1, min(len(ordered), int(-(-q * len(ordered) // 100))))
+    return ordered[rank - 1]
+
+
+class Recorder:
+    """
+    Per-endpoint latencies (ms) and status codes; transport failures are
+    recorded under status "error", exceptions raised by an in-process app
+    under "exception". server_errors collects those exceptions and the
+    errors the app logged.
+    """
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.server_errors: List[str] = []
+
+    def record(self, label: str, seconds: float, status: str) -> None:
+        self.latencies[label].append(seconds * 1000)
+        self.statuses[label][status] += 1
+
+    def server_error(self, description: str) -> None:
+        self.server_errors.append(description)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        for label, latencies in sorted(self.latencies.items()):
+            ordered = sorted(latencies)
+            statuses = dict(self.statuses[label])
+            errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+            endpoints[label] = {
+                "requests": len(ordered),
+                "errors": errors,
+                "statuses": statuses,
+                "throughput_rps": round(len(ordered) / elapsed, 2),
+                "mean_ms": round(sum(ordered) / len(ordered), 1),
+                "p50_ms": round(percentile(ordered, 50), 1),
+                "p95_ms": round(percentile(ordered, 95), 1),
+                "p99_ms": round(percentile(ordered, 99), 1),
+                "max_ms": round(ordered[-1], 1)
+            }
+        total = sum(endpoint["requests"] for endpoint in endpoints.values())
+        errors = sum(endpoint["errors"] for endpoint in endpoints.values())
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "requests": total,
+            "errors": errors,
+            "throughput_rps": round(total / elapsed, 2),
+            "server_errors": self.server_error_summary(),
+            "endpoints": endpoints
+        }
+
+    def server_error_summary(self) -> Dict[str, Any]:
+        return {
+            "count": len(self.server_errors),
+            # Distinct descriptions, most frequent first
+            "samples": [
+                {"error": error, "count": count}
+                for error, count in Counter(self.server_errors).most_common(10)
+            ]
+        }
+
+
+class ServerErrorHandler(logging.Handler):
+    """
+    Feeds every ERROR record logged in this process into the recorder.
+    """
+    def __init__(self, recorder: Recorder):
+        super().__init__(logging.ERROR)
+        self.recorder = recorder
+
+    def emit(self, record: logging.LogRecord) -> None:
+        description = f"{record.name}: {record.getMessage()}"
+        if record.exc_info and record.exc_info[1] is not None:
+            description += f" ({type(record.exc_info[1]).__name__}: {record.exc_info[1]})"
+        self.recorder.server_error(description)
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, username: str, recorder: Recorder, rng: random.Random, molecules: int):
+        self.client = client
+        self.username = username
+        self.recorder = recorder
+        self.rng = rng
+        self.molecules = SMILES[:molecules]
+        self.chat_id: Optional[str] = None
+        self.messages_sent = 0
+
+    async def request(self, op: str, method: str, url: str, **kwargs: Any) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.record(LABELS[op], time.perf_counter() - start, "error")
+            return None
+        except Exception as e:
+            # Only an in-process app raises through the transport
+            self.recorder.record(LABELS[op], time.perf_counter() - start, "exception")
+            self.recorder.server_error(f"{LABELS[op]}: {type(e).__name__}: {e}")
+            return None
+        self.recorder.record(LABELS[op], time.perf_counter() - start, str(response.status_code))
+        return response
+
+    async def create(self) -> None:
+        response = await self.request("create", "POST", "/chats", json={"username": self.username, "title": "Load test"})
+        if response is not None and response.status_code == 200:
+            self.chat_id = response.json()["chat_id"]
+            self.messages_sent = 0
+
+    async def send(self, op: str, message: str, ml_activated: bool) -> None:
+        body = {"message": message, "ml_activated": ml_activated, "chat_id": self.chat_id}
+        response = await self.request(op, "POST", "/chat", json=body)
+        if response is not None and response.status_code == 200:
+            self.messages_sent += 1
+
+    async def chat(self) -> None:
+        await self.send("chat", self.rng.choice(QUESTIONS), False)
+
+    async def admet(self) -> None:
+        await self.send("admet", f"@admet_prediction {self.rng.choice(self.molecules)}", True)
+
+    async def binding(self) -> None:
+        protein, smiles = self.rng.choice(PROTEINS), self.rng.choice(self.molecules)
+        await self.send("binding", f"@binding_affinity protein {protein} ligand {smiles}", True)
+
+    async def messages(self) -> None:
+        await self.request("messages", "GET", f"/chats/{self.chat_id}/messages", params={"limit": 50})
+
+    async def summary(self) -> None:
+        # A summary of an empty chat is a 404, not what real users request
+        if self.messages_sent:
+            await self.request("summary", "GET", f"/chats/{self.chat_id}/summary")
+        else:
+            await self.chat()
+
+    async def run(self, mix: Dict[str, float], deadline: float, budget: List[int], think_ms: float) -> None:
+        ops: List[Tuple[str, Callable]] = [(name, getattr(self, name)) for name in mix]
+        weights = list(mix.values())
+        while time.monotonic() < deadline and budget[0] > 0:
+            budget[0] -= 1
+            if self.chat_id is None:
+                await self.create()
+            else:
+                _, op = self.rng.choices(ops, weights)[0]
+                await op()
+            if think_ms:
+                await asyncio.sleep(self.rng.expovariate(1000 / think_ms))
+
+
+async def run_load(
+    args: argparse.Namespace,
+    transport: Optional[httpx.AsyncBaseTransport],
+    base_url: str,
+    recorder: Optional[Recorder] = None
+) -> Dict[str, Any]:
+    recorder = recorder or Recorder()
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    budget = [args.requests or float("inf")]
+    timeout = httpx.Timeout(args.timeout)
+
+    clients = [httpx.AsyncClient(transport=transport, base_url=base_url, timeout=timeout) for _ in range(args.concurrency)]
+    users = [
+        VirtualUser(client, f"loadtest-{i % args.users}", recorder, random.Random(rng.random()), args.molecules)
+        for i, client in enumerate(clients)
+    ]
+    start = time.monotonic()
+    try:
+        await asyncio.gather(*(user.run(mix, start + args.duration, budget, args.think_ms) for user in users))
+    finally:
+        for client in clients:
+            await client.aclose()
+    elapsed = time.monotonic() - start
+
+    report = recorder.report(elapsed)
+    report["config"] = {
+        "target": base_url if transport is None else "in-process",
+        "concurrency": args.concurrency,
+        "users": args.users,
+        "mix": mix,
+        "think_ms": args.think_ms,
+        "molecules": args.molecules
+    }
+    return report
+
+
+async def run_in_process(args: argparse.Namespace) -> Dict[str, Any]:
+    standins.install(args)
+    report_stand_ins = {
+        "mongo": args.mongo_url or "in-memory",
+        "gemini_latency_ms": args.gemini_latency_ms,
+        "admet_latency_ms": args.admet_latency_ms,
+        "plapt_ms_per_molecule": args.plapt_ms_per_molecule
+    }
+
+    import main
+    # main replaces the root handlers when it configures logging
+    recorder = Recorder()
+    handler = ServerErrorHandler(recorder)
+    logging.getLogger().addHandler(handler)
+    try:
+        await main.app.router.startup()
+        try:
+            report = await run_load(args, httpx.ASGITransport(app=main.app), "http://loadtest", recorder)
+        finally:
+            await main.app.router.shutdown()
+    finally:
+        logging.getLogger().removeHandler(handler)
+    # Errors logged during shutdown (the final flushes) count too
+    report["server_errors"] = recorder.server_error_summary()
+    report["config"]["stand_ins"] = report_stand_ins
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the chat API with a mix of endpoints.")
+    parser.add_argument("--base-url", default=None, help="test a running server instead of an in-process app")
+    parser.add_argument("--concurrency", type=int, default=16, help="virtual users issuing requests in parallel")
+    parser.add_argument("--users", type=int, default=8, help="distinct usernames the virtual users share")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests (0 = duration only)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation=weight list over " + ",".join(LABELS))
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean pause between a user's requests")
+    parser.add_argument("--molecules", type=int, default=len(SMILES), choices=range(1, len(SMILES) + 1),
+                        metavar=f"1..{len(SMILES)}", help="distinct molecules in ML requests; fewer means more cache hits")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request client timeout in seconds")
+    parser.add_argument("--output", default=None, help="write the JSON report here as well as to stdout")
+    standins.add_arguments(parser)
+    args = parser.parse_args()
+    parse_mix(args.mix)
+    # One INFO line per request would dominate the run
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    if args.base_url:
+        report = asyncio.run(run_load(args, None, args.base_url))
+    else:
+        report = asyncio.run(run_in_process(args))
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(text + "\n")
+    if report["server_errors"]["count"]:
+        sys.exit(f"{report['server_errors']['count']} server-side errors, see server_errors in the report")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Runs the API on its own behind the load-test stand-ins (fake Gemini,
+in-memory or local Mongo, stub ADMET, tiny Plapt), for driving it with
+loadtest.run_load --base-url from another process.
+
+Run from the Server directory:
+
+    python -m loadtest.serve --port 8000 --gemini-latency-ms 800 --admet-latency-ms 20000
+
+One worker only: the in-memory database lives in the server process.
+"""
+import argparse
+
+import uvicorn
+
+from loadtest import standins
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API behind local stand-ins.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    standins.add_arguments(parser)
+    args = parser.parse_args()
+
+    standins.install(args)
+    import main as server
+    uvicorn.run(server.app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Local stand-ins for everything the server talks to, so the real FastAPI app
+can be load tested on one machine:
+
+- Gemini: loadtest.fake_gemini served on a local port (real SDK, real HTTP)
+- MongoDB: mongomock-motor in memory, or any local mongod via --mongo-url
+- ADMET: a stub admet.scrape that waits like a browser session and returns
+  a SwissADME-shaped frame
+- Plapt: hashed n-gram encoders with ProtBert/ChemBERTa-sized outputs and a
+  linear head, deterministic per (target, molecule)
+
+install() must run before main (or any service module) is imported, since
+the database client and the Gemini base URL are read at import time.
+Dev-only requirements: loadtest/requirements.txt.
+"""
+import argparse
+import hashlib
+import logging
+import os
+import sys
+import threading
+import time
+import types
+from typing import Any, Dict, List
+
+import numpy as np
+
+from loadtest.fake_gemini import FakeGeminiConfig, create_app
+
+logger = logging.getLogger(__name__)
+
+PROTEIN_DIM = 1024
+MOLECULE_DIM = 768
+
+# One row as written by SwissADME's CSV export, for the columns the server reads
+ADMET_ROW: Dict[str, Any] = {
+    "Formula": "C9H8O4", "MW": 180.16, "#Heavy atoms": 13, "#Aromatic heavy atoms": 6,
+    "Fraction Csp3": 0.11, "#Rotatable bonds": 3, "#H-bond acceptors": 4, "#H-bond donors": 1,
+    "MR": 44.71, "TPSA": 63.6, "iLOGP": 1.3, "XLOGP3": 1.19, "WLOGP": 1.31, "MLOGP": 1.51,
+    "Silicos-IT Log P": 1.1, "Consensus Log P": 1.28, "ESOL Log S": -1.85,
+    "ESOL Solubility (mg/ml)": 2.56, "ESOL Class": "Very soluble", "Ali Log S": -2.21,
+    "Ali Solubility (mg/ml)": 1.11, "Ali Class": "Soluble", "Silicos-IT LogSw": -1.68,
+    "Silicos-IT Solubility (mg/ml)": 3.77, "Silicos-IT class": "Soluble", "GI absorption": "High",
+    "BBB permeant": "No", "Pgp substrate": "No", "CYP1A2 inhibitor": "No", "CYP2C19 inhibitor": "No",
+    "CYP2C9 inhibitor": "No", "CYP2D6 inhibitor": "No", "CYP3A4 inhibitor": "No",
+    "log Kp (cm/s)": -6.55, "Lipinski #violations": 0, "Ghose #violations": 0, "Veber #violations": 0,
+    "Egan #violations": 0, "Muegge #violations": 1, "Bioavailability Score": 0.85,
+    "PAINS #alerts": 0, "Brenk #alerts": 1, "Leadlikeness #violations": 1, "Synthetic Accessibility": 1.0,
+}
+
+
+def hashed_ngrams(text: str, dim: int, n: int = 3) -> np.ndarray:
+    """
+    L2-normalized bag of hashed character n-grams; stable across processes.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for i in range(max(1, len(text) - n + 1)):
+        digest = hashlib.blake2b(text[i:i + n].encode(), digest_size=8).digest()
+        vector[int.from_bytes(digest, "little") % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class TinyPlapt:
+    """
+    Same interface as binding_affinity.plapt.Plapt for what the server
+    calls. Encoding really runs (numpy releases the GIL for the head, like
+    torch does); compute_ms_per_molecule adds a sleep per molecule to
+    approximate the cost of the real encoders on the target hardware.
+    """
+    compute_ms_per_molecule = 0.0
+
+    def __init__(self, **kwargs: Any):
+        rng = np.random.default_rng(0)
+        self.head = rng.standard_normal(PROTEIN_DIM + MOLECULE_DIM).astype(np.float32) / 8
+        self.protein_window = kwargs.get("protein_window")
+        self._proteins: Dict[str, np.ndarray] = {}
+
+    def encode_proteins(self, prot_seqs: List[str], batch_size: int = 2) -> np.ndarray:
+        for seq in prot_seqs:
+            if seq not in self._proteins:
+                self._proteins[seq] = hashed_ngrams(seq, PROTEIN_DIM)
+        return np.stack([self._proteins[seq] for seq in prot_seqs])
+
+    def encode_molecules(self, mol_smiles: List[str], batch_size: int = 16) -> np.ndarray:
+        return np.stack([hashed_ngrams(smiles, MOLECULE_DIM) for smiles in mol_smiles])
+
+    def score_candidates(self, target_protein: str, mol_smiles: List[str], mol_batch_size: int = 16, affinity_batch_size: int = 128) -> List[Dict[str, float]]:
+        if self.compute_ms_per_molecule:
+            time.sleep(self.compute_ms_per_molecule * len(mol_smiles) / 1000)
+        protein = self.encode_proteins([target_protein])[0]
+        molecules = self.encode_molecules(mol_smiles, mol_batch_size)
+        features = np.hstack([np.broadcast_to(protein, (len(mol_smiles), PROTEIN_DIM)), molecules])
+        results = []
+        for logit in features @ self.head:
+            neg_log10_affinity_M = float(6 + 3 * np.tanh(logit))
+            results.append({
+                "neg_log10_affinity_M": neg_log10_affinity_M,
+                "affinity_uM": float((10**6) * (10**(-neg_log10_affinity_M)))
+            })
+        return results
+
+
+def install_memory_mongo() -> None:
+    try:
+        import mongomock_motor
+    except ImportError:
+        sys.exit("The in-memory database needs mongomock-motor (pip install -r loadtest/requirements.txt), or pass --mongo-url.")
+    import motor.motor_asyncio
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+
+def install_admet_stub(latency_ms: float) -> None:
+    """
+    Replaces the Selenium scraper; each call blocks a browser-pool thread
+    for latency_ms, as a real SwissADME session would.
+    """
+    import pandas as pd
+
+    def automate_download(unique_id, smiles_code="CC(C)CO", download_dir=None):
+        time.sleep(latency_ms / 1000)
+        return pd.DataFrame([{**ADMET_ROW, "Canonical SMILES": smiles_code}]), None, None
+
+    module = types.ModuleType("admet.scrape")
+    module.automate_download = automate_download
+    sys.modules["admet.scrape"] = module
+
+
+def install_tiny_plapt(compute_ms_per_molecule: float) -> None:
+    TinyPlapt.compute_ms_per_molecule = compute_ms_per_molecule
+    module = types.ModuleType("binding_affinity.plapt")
+    module.Plapt = TinyPlapt
+    sys.modules["binding_affinity.plapt"] = module
+
+
+def start_fake_gemini(config: FakeGeminiConfig, port: int) -> str:
+    """
+    Serves the fake Gemini API from a background thread with its own event
+    loop, so its latency does not come out of the server's loop. Returns
+    the base URL once it accepts connections.
+    """
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(create_app(config), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="fake-gemini", daemon=True).start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            sys.exit(f"Fake Gemini did not start on port {port}")
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group("stand-ins")
+    group.add_argument("--mongo-url", default=None, help="use this MongoDB instead of the in-memory one")
+    group.add_argument("--gemini-latency-ms", type=float, default=300.0)
+    group.add_argument("--gemini-jitter-ms", type=float, default=100.0)
+    group.add_argument("--gemini-rpm", type=int, default=None, help="fake quota; 429 above this rate")
+    group.add_argument("--gemini-port", type=int, default=8089)
+    group.add_argument("--admet-latency-ms", type=float, default=2000.0, help="duration of one stub SwissADME session")
+    group.add_argument("--plapt-ms-per-molecule", type=float, default=5.0, help="extra model time per scored molecule")
+    group.add_argument("--seed", type=int, default=0)
+
+
+def install(args: argparse.Namespace) -> str:
+    """
+    Installs every stand-in from parsed add_arguments() options and returns
+    the fake Gemini base URL.
+    """
+    if args.mongo_url:
+        os.environ["MONGODB_URL"] = args.mongo_url
+        os.environ.setdefault("DB_NAME", "ml_tool_loadtest")
+    else:
+        install_memory_mongo()
+    install_admet_stub(args.admet_latency_ms)
+    install_tiny_plapt(args.plapt_ms_per_molecule)
+
+    base_url = start_fake_gemini(
+        FakeGeminiConfig(
+            latency_ms=args.gemini_latency_ms,
+            jitter_ms=args.gemini_jitter_ms,
+            requests_per_minute=args.gemini_rpm,
+            seed=args.seed
+        ),
+        args.gemini_port
+    )
+    os.environ["GEMINI_BASE_URL"] = base_url
+    os.environ["GEMINI_API_KEY"] = "loadtest"
+    logger.info("Stand-ins installed; fake Gemini at %s", base_url)
+    return base_url
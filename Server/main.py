@@ -1,6 +1,15 @@
 import asyncio
+import logging
+import math
+import os
+import time
 import uuid
-from fastapi import FastAPI, Request, Response, Depends, HTTPException
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from fastapi import FastAPI, Request, Response, Depends, HTTPException, Query, UploadFile
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from fastapi.responses import JSONResponse, StreamingResponse
 from starlette.middleware.sessions import SessionMiddleware
 import uvicorn
 
@@ -10,23 +19,125 @@ from models.pydantic_models import (
     ResetResponse, 
     CreateChatRequest, 
     CreateChatResponse,
-    UserChatsResponse
+    UserChatsResponse,
+    ScreenRequest
 )
 from services.chat_session import ChatSession
-from services.session_service import sessions, get_session
-from services.llm_service import process_message, generate_chat_summary
+from services.session_service import load_chat_session, session_backend
+from services.llm_service import detect_ml_task, process_message, generate_chat_summary
+from services.admission import AdmissionRejected, admit
+from services.llm_scheduler import LLMRequestError, LLMUnavailableError
+from services.write_behind import WriteBehindFull
+from services.payload_store import get_blob
+from services.molecule_index import molecule_index
+from services.screening import (
+    SCREEN_MAX_UPLOAD_BYTES,
+    UPLOAD_CHUNK_BYTES,
+    ScreeningError,
+    parse_smiles_file,
+    read_limited,
+    screen,
+    stream_screen_results
+)
+from services.executors import shutdown_pools
+from services.warmup import WARMUP_MODELS, readiness, warm_up
 from services.chat_service import (
+    CHAT_LIST_PAGE_SIZE,
     create_chat, 
-    get_user_chats, 
-    store_message, 
+    get_user_chats_page,
+    store_turn,
     get_chat_messages,
-    chat_exists
+    get_chat_message_documents_page,
+    iter_chat_messages,
+    chat_exists,
+    get_chat_metadata,
+    write_behind
 )
+from models.database import client as mongo_client
+from models.indexes import ensure_indexes
 from utils.session_cleanup import cleanup_old_sessions
+from utils.fast_json import encode_messages, stream_messages, stream_messages_ndjson, validate_message_stream
+from utils.metrics import REQUEST_LATENCY, render_metrics, track_stage
+from utils.request_context import configure_logging, new_request_id, request_id_var
+
+configure_logging()
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Drug Discovery")
 app.add_middleware(SessionMiddleware, secret_key="your_secret_key")
 
+@app.middleware("http")
+async def request_context_middleware(request: Request, call_next):
+    """
+    Tags the request with an id (echoed back as X-Request-ID and attached to
+    every log line) and records its latency by route.
+    """
+    token = request_id_var.set(new_request_id(request.headers.get("x-request-id")))
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id_var.get()
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(
+            request.method,
+            route.path if route is not None else "unmatched",
+            str(status)
+        ).observe(time.perf_counter() - start)
+        request_id_var.reset(token)
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """
+    Too many expensive requests in flight: refuse quickly instead of queueing
+    more browser sessions or model runs than the node can hold.
+    """
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+    )
+
+@app.exception_handler(LLMUnavailableError)
+async def llm_unavailable_handler(request: Request, exc: LLMUnavailableError):
+    """
+    Gemini stayed saturated past the queueing deadline: tell the client to
+    come back later instead of answering with an empty message.
+    """
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+    )
+
+@app.exception_handler(LLMRequestError)
+async def llm_request_error_handler(request: Request, exc: LLMRequestError):
+    """
+    Gemini failed a request for good: report the upstream failure instead of
+    answering with an empty message.
+    """
+    return JSONResponse(status_code=502, content={"detail": str(exc)})
+
+@app.exception_handler(WriteBehindFull)
+async def write_behind_full_handler(request: Request, exc: WriteBehindFull):
+    """
+    Mongo has been unreachable long enough to fill the write-behind buffer:
+    refuse new turns instead of buffering without bound.
+    """
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+    )
+
+# Answered with 429/503 and Retry-After: the client sends the same message
+# again, so a failed turn of this kind leaves no trace
+RETRYABLE_CHAT_ERRORS = (AdmissionRejected, LLMUnavailableError, WriteBehindFull)
+
 @app.post("/chats", response_model=CreateChatResponse)
 async def start_new_chat(request: CreateChatRequest):
     """
@@ -35,7 +146,7 @@ async def start_new_chat(request: CreateChatRequest):
     """
     chat_id = await create_chat(request.username, request.title)
     
-    sessions[chat_id] = ChatSession()
+    await session_backend.save(chat_id, ChatSession())
     
     chat = await get_chat_details(chat_id)
     return CreateChatResponse(
@@ -45,21 +156,36 @@ async def start_new_chat(request: CreateChatRequest):
     )
 
 @app.get("/users/{username}/chats", response_model=UserChatsResponse)
-async def get_user_chat_history(username: str):
+async def get_user_chat_history(
+    username: str,
+    limit: int = Query(CHAT_LIST_PAGE_SIZE, ge=1, le=200),
+    cursor: Optional[str] = None,
+    include_total: bool = False
+):
     """
-    Get all chats for a user.
-    This will be used in the navigation bar to show past chats.
+    Get the chats of a user, newest activity first, one page at a time.
+    This will be used in the navigation bar to show past chats. `limit`
+    sets the page size and `cursor` (the previous page's `next_cursor`)
+    fetches the next one; `include_total` adds the overall count.
     """
-    chats = await get_user_chats(username)
-    return UserChatsResponse(chats=chats)
+    try:
+        with track_stage("get_user_chats"):
+            chats, next_cursor, total = await get_user_chats_page(
+                username, limit=limit, cursor=cursor, include_total=include_total
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Validated once here and serialized by pydantic; returning a Response
+    # keeps FastAPI from dumping and validating it a second time against
+    # response_model, which stays for the schema
+    page = UserChatsResponse(chats=chats, next_cursor=next_cursor, total=total)
+    return Response(content=page.model_dump_json(), media_type="application/json")
 
 async def get_chat_details(chat_id: str):
     """
     Helper function to get chat details.
     """
-    from models.database import chats_collection
-    
-    chat = await chats_collection.find_one({"chat_id": chat_id})
+    chat = await get_chat_metadata(chat_id)
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
     
@@ -70,33 +196,58 @@ async def chat(chat_request: ChatRequest, request: Request, response: Response):
     """
     API endpoint for chat interactions.
     """
-    if not await chat_exists(chat_request.chat_id):
-        raise HTTPException(status_code=404, detail="Chat not found")
+    with track_stage("chat_exists"):
+        metadata = await get_chat_metadata(chat_request.chat_id)
+        if metadata is None:
+            raise HTTPException(status_code=404, detail="Chat not found")
     
-    session = sessions.get(chat_request.chat_id)
-    if not session:
-        session = ChatSession()
-        sessions[chat_request.chat_id] = session
+    user_created_at = datetime.utcnow()
+    session = None
+    history = ()
+    response_text = None
     
-    await store_message(
-        chat_id=chat_request.chat_id,
-        role="user",
-        content=chat_request.message
-    )
+    try:
+        # ADMET and binding requests wait for (or are refused) a slot before
+        # anything is done for them
+        async with admit(detect_ml_task(chat_request.message), metadata["username"]):
+            session = await load_chat_session(chat_request.chat_id)
+            history = session.history_checkpoint()
+            
+            with track_stage("process_message"):
+                response_text, updated_params = await process_message(
+                    chat_request.message, 
+                    session, 
+                    chat_request.ml_activated
+                )
+        
+        with track_stage("store_turn"):
+            await store_turn(
+                chat_id=chat_request.chat_id,
+                user_content=chat_request.message,
+                assistant_content=response_text,
+                ml_activated=session.ml_activated,
+                parameters=updated_params,
+                user_created_at=user_created_at
+            )
+    except Exception as e:
+        # The turn did not happen, so the session must not remember it
+        if session is not None:
+            session.restore_history(history)
+        # Without an answer the question still belongs to the chat, unless
+        # the client was told to retry it
+        if response_text is None and not isinstance(e, RETRYABLE_CHAT_ERRORS):
+            try:
+                await store_turn(
+                    chat_id=chat_request.chat_id,
+                    user_content=chat_request.message,
+                    assistant_content=None,
+                    user_created_at=user_created_at
+                )
+            except Exception:
+                logger.exception("Storing the unanswered message of chat %s failed", chat_request.chat_id)
+        raise
     
-    response_text, updated_params = await process_message(
-        chat_request.message, 
-        session, 
-        chat_request.ml_activated
-    )
-    
-    await store_message(
-        chat_id=chat_request.chat_id,
-        role="assistant",
-        content=response_text,
-        ml_activated=session.ml_activated,
-        parameters=updated_params
-    )
+    await session_backend.save(chat_request.chat_id, session)
     
     return ChatResponse(
         response=response_text,
@@ -107,15 +258,97 @@ async def chat(chat_request: ChatRequest, request: Request, response: Response):
     )
 
 @app.get("/chats/{chat_id}/messages")
-async def get_chat_message_history(chat_id: str):
+async def get_chat_message_history(
+    chat_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    stream: bool = False
+):
     """
-    Get all messages for a specific chat.
+    Get the messages of a specific chat.
+    Without parameters returns all of them, streamed from the database. With `limit` (and optionally a
+    `before`/`after` cursor from a previous page) returns one page plus the
+    cursors of the neighbouring pages. With `stream=true` returns every message
+    after the optional `after` cursor as NDJSON, one document per line.
     """
     if not await chat_exists(chat_id):
         raise HTTPException(status_code=404, detail="Chat not found")
     
-    messages = await get_chat_messages(chat_id)
-    return {"messages": [message.dict() for message in messages]}
+    if stream:
+        if before or limit:
+            raise HTTPException(status_code=400, detail="stream only supports the after cursor")
+        try:
+            documents = await validate_message_stream(iter_chat_messages(chat_id, after=after))
+        except ValidationError:
+            raise  # a stored message that no longer fits the schema is ours, not the caller's
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        return StreamingResponse(stream_messages_ndjson(documents), media_type="application/x-ndjson")
+    
+    if limit or before or after:
+        try:
+            with track_stage("get_chat_messages_page"):
+                documents, prev_cursor, next_cursor = await get_chat_message_documents_page(
+                    chat_id, limit=limit or 50, before=before, after=after
+                )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return Response(
+            content=encode_messages(documents, {"prev_cursor": prev_cursor, "next_cursor": next_cursor}),
+            media_type="application/json"
+        )
+    
+    # Full history: encoded straight from the database cursor; messages are
+    # validated but never turned into models and back
+    documents = await validate_message_stream(iter_chat_messages(chat_id))
+    return StreamingResponse(stream_messages(documents), media_type="application/json")
+
+@app.get("/users/{username}/molecules")
+async def lookup_molecule(username: str, smiles: str, limit: int = Query(20, ge=1, le=200)):
+    """
+    Find the chats and messages where a user discussed a compound.
+    Matches on the InChIKey, so any valid SMILES of the same structure works.
+    """
+    with track_stage("molecule_lookup"):
+        result = await molecule_index.lookup(smiles, username, limit)
+    if result is None:
+        raise HTTPException(status_code=400, detail="Invalid SMILES")
+    return result
+
+@app.get("/users/{username}/molecules/similar")
+async def find_similar_molecules(
+    username: str,
+    smiles: str,
+    threshold: float = Query(0.7, ge=0.0, le=1.0),
+    limit: int = Query(20, ge=1, le=200)
+):
+    """
+    Compounds the user already discussed or scored that are similar to the
+    given one (Tanimoto on Morgan fingerprints), most similar first.
+    """
+    results = await molecule_index.similar(smiles, username, threshold, limit)
+    if results is None:
+        raise HTTPException(status_code=400, detail="Invalid SMILES")
+    return {"results": results}
+
+@app.get("/blobs/{digest}")
+async def get_blob_content(digest: str):
+    """
+    Serve a binary artifact (e.g. a molecule image) referenced from a message
+    as blob://{digest}. Blobs are content-addressed and never change.
+    """
+    blob = await get_blob(digest)
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    
+    data, mime = blob
+    return Response(
+        content=data,
+        media_type=mime,
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
 
 @app.get("/chats/{chat_id}/summary")
 async def get_chat_summary(chat_id: str):
@@ -126,12 +359,64 @@ async def get_chat_summary(chat_id: str):
     if not await chat_exists(chat_id):
         raise HTTPException(status_code=404, detail="Chat not found")
     
-    messages = await get_chat_messages(chat_id)
+    with track_stage("get_chat_messages"):
+        messages = await get_chat_messages(chat_id)
     
     summary = await generate_chat_summary(messages)
     
     return summary
 
+async def upload_chunks(upload: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await upload.read(UPLOAD_CHUNK_BYTES):
+        yield chunk
+
+@app.post("/screen")
+async def screen_molecules(request: Request):
+    """
+    Bulk binding-affinity screening of many molecules against one target,
+    without the chat and LLM path. Accepts either a JSON ScreenRequest or a
+    multipart form with `username`, `protein_sequence`, a `file` of SMILES
+    (one per line), and optional `top_k` and `explain`. Streams the ranked results
+    as NDJSON; an LLM explanation is only generated when `explain` is set.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > SCREEN_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"At most {SCREEN_MAX_UPLOAD_BYTES} bytes per request.")
+    
+    try:
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            data = b""
+            if upload is not None and not isinstance(upload, str):
+                data = await read_limited(upload_chunks(upload))
+            screen_request = ScreenRequest(
+                username=form.get("username", ""),
+                protein_sequence=form.get("protein_sequence", ""),
+                smiles=parse_smiles_file(data),
+                top_k=form.get("top_k") or None,
+                explain=form.get("explain", "false").lower() in ("1", "true", "yes", "on")
+            )
+        else:
+            screen_request = ScreenRequest.model_validate_json(await read_limited(request.stream()))
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    except ScreeningError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    try:
+        async with admit("screen", screen_request.username):
+            result = await screen(
+                screen_request.protein_sequence,
+                screen_request.smiles,
+                top_k=screen_request.top_k,
+                explain=screen_request.explain
+            )
+    except ScreeningError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    return StreamingResponse(stream_screen_results(result), media_type="application/x-ndjson")
+
 @app.post("/reset", response_model=ResetResponse)
 async def reset_session(request: Request):
     """
@@ -139,22 +424,81 @@ async def reset_session(request: Request):
     """
     session_id = request.cookies.get("session_id")
     
-    if session_id and session_id in sessions:
-        sessions[session_id] = ChatSession()
+    if session_id and await session_backend.load(session_id) is not None:
+        await session_backend.save(session_id, ChatSession())
     
     return ResetResponse(
         status="success",
         message="Session reset successfully."
     )
 
+@app.get("/healthz")
+async def healthz():
+    """
+    Liveness: the process is serving requests. Also reports which
+    subsystems are warm.
+    """
+    return {"status": "ok", "subsystems": readiness.snapshot()}
+
+@app.get("/readyz")
+async def readyz():
+    """
+    Readiness: MongoDB answers and every subsystem listed in WARMUP_MODELS
+    has finished warming up. Returns 503 until then.
+    """
+    try:
+        await asyncio.wait_for(mongo_client.admin.command("ping"), timeout=2)
+        database_ok = True
+    except Exception:
+        database_ok = False
+    
+    ready = database_ok and readiness.is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "database": database_ok,
+            "required": WARMUP_MODELS,
+            "subsystems": readiness.snapshot()
+        }
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus scrape endpoint.
+    """
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
 @app.on_event("startup")
 async def startup_event():
+    await ensure_indexes()
+    
+    if write_behind is not None:
+        write_behind.start()
+    
+    asyncio.create_task(molecule_index.load())
+    molecule_index.start()
+    
+    if WARMUP_MODELS:
+        asyncio.create_task(warm_up())
+    
     async def periodic_cleanup():
         while True:
             await cleanup_old_sessions()
-            await asyncio.sleep(900)
+            await asyncio.sleep(60)
     
     asyncio.create_task(periodic_cleanup())
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if write_behind is not None:
+        await write_behind.stop()
+    
+    await molecule_index.stop()
+    shutdown_pools()
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Several workers need SESSION_BACKEND=mongo to share conversations
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=int(os.getenv("WEB_CONCURRENCY", "1")))
\ No newline at end of file
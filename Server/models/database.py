@@ -11,4 +11,8 @@ client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URL)
 database = client[DB_NAME]
 
 chats_collection = database.chats
-messages_collection = database.messages
\ No newline at end of file
+messages_collection = database.messages
+blobs_collection = database.blobs
+molecules_collection = database.molecules
+molecule_mentions_collection = database.molecule_mentions
+sessions_collection = database.sessions
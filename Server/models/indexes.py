@@ -0,0 +1,78 @@
+import logging
+import os
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from models.database import database
+
+logger = logging.getLogger(__name__)
+
+# Shared sessions untouched for this long are removed by Mongo. Changing it
+# on an existing deployment needs a collMod, createIndexes will refuse.
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_SHARED_TTL", str(7 * 24 * 3600)))
+
+# Every query the services run must be covered by one of these. When adding a
+# query shape, add its index here and its plan to tools/verify_query_plans.py.
+INDEX_SPECS: Dict[str, List[IndexModel]] = {
+    "chats": [
+        # chat_exists, get_chat_details, store_turn's metadata update
+        IndexModel([("chat_id", ASCENDING)], name="chat_id_unique", unique=True),
+        # get_user_chats_page: filter by owner, newest activity first,
+        # chat_id as tie breaker
+        IndexModel(
+            [("username", ASCENDING), ("last_message_at", DESCENDING), ("chat_id", DESCENDING)],
+            name="username_last_message_at_chat_id"
+        ),
+    ],
+    "messages": [
+        # get_chat_messages, iter_chat_messages and the keyset pages: one
+        # chat's messages ordered by (created_at, id)
+        IndexModel(
+            [("chat_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)],
+            name="chat_id_created_at_id"
+        ),
+    ],
+    "molecule_mentions": [
+        # one mention per molecule per message, also the upsert key
+        IndexModel(
+            [("inchikey", ASCENDING), ("message_id", ASCENDING)],
+            name="inchikey_message_id_unique",
+            unique=True
+        ),
+        # MoleculeIndex.mentions: a user's latest mentions of a molecule
+        IndexModel(
+            [("inchikey", ASCENDING), ("username", ASCENDING), ("created_at", DESCENDING)],
+            name="inchikey_username_created_at"
+        ),
+    ],
+    "sessions": [
+        # MongoSessionBackend looks sessions up by _id; this only expires them
+        IndexModel([("updated_at", ASCENDING)], name="updated_at_ttl", expireAfterSeconds=SESSION_TTL_SECONDS),
+    ],
+}
+
+# Indexes earlier versions created that a wider one in INDEX_SPECS now
+# covers; they only cost writes and memory, so they are dropped.
+SUPERSEDED_INDEXES: Dict[str, List[str]] = {
+    "chats": ["username_last_message_at"],
+    "messages": ["chat_id_created_at"],
+}
+
+
+async def ensure_indexes() -> None:
+    """
+    Creates any missing index from INDEX_SPECS and drops the ones in
+    SUPERSEDED_INDEXES. createIndexes is a no-op for indexes that already
+    exist with the same definition, so this is safe to run on every startup.
+    """
+    for collection_name, names in SUPERSEDED_INDEXES.items():
+        existing = await database[collection_name].index_information()
+        for name in names:
+            if name in existing:
+                await database[collection_name].drop_index(name)
+                logger.info("Dropped superseded index %s on %s", name, collection_name)
+
+    for collection_name, indexes in INDEX_SPECS.items():
+        created = await database[collection_name].create_indexes(indexes)
+        logger.info("Indexes ensured on %s: %s", collection_name, ", ".join(created))
@@ -38,6 +38,8 @@ class ChatHistoryItem(BaseModel):
 
 class UserChatsResponse(BaseModel):
     chats: List[ChatHistoryItem]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
 
 class MessageModel(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -46,4 +48,11 @@ class MessageModel(BaseModel):
     content: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
     ml_activated: bool = False
-    parameters: Optional[Dict[str, Any]] = None
\ No newline at end of file
+    parameters: Optional[Dict[str, Any]] = None
+
+class ScreenRequest(BaseModel):
+    username: str = Field(..., min_length=1)
+    protein_sequence: str
+    smiles: List[str]
+    top_k: Optional[int] = Field(None, ge=1)
+    explain: bool = False
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+from services.executors import BROWSER_POOL_SIZE
+from utils.metrics import ADMISSION_REJECTIONS, ADMISSION_WAIT_SECONDS, register_queue
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when an expensive request cannot be admitted: the wait queue is
+    full, the user already has as much in flight as allowed, or no slot
+    freed up before the queueing deadline. Answered with 429.
+    """
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Admission for one kind of expensive work (browser sessions, model
+    runs): at most max_concurrency requests in flight, at most
+    max_per_user of them (and as many queued) for one username, and a FIFO
+    wait queue of max_queue entries, each waiting at most max_wait seconds.
+    Anything beyond that is rejected immediately, so an overload turns into
+    fast 429s instead of piles of Chrome processes and Plapt batches.
+
+    Lives on the event loop: every request acquires its slot before any of
+    its blocking work is handed to an executor pool.
+    """
+    def __init__(self, task: str, max_concurrency: int, max_per_user: int, max_queue: int, max_wait: float):
+        self.task = task
+        self.max_concurrency = max_concurrency
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self.active = 0
+        self._active_by_user: Dict[str, int] = defaultdict(int)
+        self._queued_by_user: Dict[str, int] = defaultdict(int)
+        self._waiters: Deque[Tuple[Optional[str], asyncio.Future]] = deque()
+        # Running average of how long a slot is held, for Retry-After
+        self._avg_hold = 1.0
+
+        register_queue(f"admission_{task}", lambda: len(self._waiters), lambda: self.active)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _can_run(self, username: Optional[str]) -> bool:
+        if self.active >= self.max_concurrency:
+            return False
+        return username is None or self._active_by_user.get(username, 0) < self.max_per_user
+
+    def _grant(self, username: Optional[str]) -> None:
+        self.active += 1
+        if username is not None:
+            self._active_by_user[username] += 1
+
+    def _dispatch(self) -> None:
+        # Hand freed slots to the oldest waiters that may run; a waiter held
+        # back only by its own user's limit does not block the others
+        for entry in list(self._waiters):
+            if self.active >= self.max_concurrency:
+                break
+            username, future = entry
+            if self._can_run(username):
+                self._waiters.remove(entry)
+                self._forget_waiter(username)
+                self._grant(username)
+                future.set_result(None)
+
+    def _forget_waiter(self, username: Optional[str]) -> None:
+        if username is not None:
+            self._queued_by_user[username] -= 1
+            if not self._queued_by_user[username]:
+                del self._queued_by_user[username]
+
+    def _retry_after(self) -> float:
+        backlog = (len(self._waiters) + 1) / self.max_concurrency
+        return min(max(1.0, self._avg_hold * backlog), max(1.0, self.max_wait))
+
+    def _reject(self, reason: str, message: str) -> AdmissionRejected:
+        ADMISSION_REJECTIONS.labels(self.task, reason).inc()
+        logger.warning("Rejected %s request: %s", self.task, reason)
+        return AdmissionRejected(message, retry_after=self._retry_after())
+
+    async def acquire(self, username: Optional[str] = None) -> None:
+        if self._can_run(username):
+            self._grant(username)
+            ADMISSION_WAIT_SECONDS.labels(self.task).observe(0)
+            return
+
+        if username is not None and self._queued_by_user.get(username, 0) >= self.max_per_user:
+            raise self._reject("user_limit", "Too many of your requests are already running, please retry shortly.")
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject("queue_full", "The server is busy, please retry shortly.")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (username, future)
+        self._waiters.append(entry)
+        if username is not None:
+            self._queued_by_user[username] += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.max_wait)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # Granted in the same tick as the timeout or cancellation
+                self.release(username, 0.0)
+            else:
+                future.cancel()
+                self._waiters.remove(entry)
+                self._forget_waiter(username)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject("deadline", "The server is busy, please retry shortly.") from None
+            raise
+        ADMISSION_WAIT_SECONDS.labels(self.task).observe(time.perf_counter() - start)
+
+    def release(self, username: Optional[str] = None, held: Optional[float] = None) -> None:
+        self.active -= 1
+        if username is not None:
+            self._active_by_user[username] -= 1
+            if not self._active_by_user[username]:
+                del self._active_by_user[username]
+        if held:
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * held
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admit(self, username: Optional[str] = None) -> AsyncIterator[None]:
+        await self.acquire(username)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(username, time.perf_counter() - start)
+
+
+def _controller(task: str, prefix: str, max_concurrency: int, max_per_user: int, max_queue: int, max_wait: float) -> AdmissionController:
+    return AdmissionController(
+        task,
+        max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", str(max_concurrency))),
+        max_per_user=int(os.getenv(f"{prefix}_MAX_PER_USER", str(max_per_user))),
+        max_queue=int(os.getenv(f"{prefix}_MAX_QUEUE", str(max_queue))),
+        max_wait=float(os.getenv(f"{prefix}_MAX_QUEUE_WAIT", str(max_wait)))
+    )
+
+
+# Keyed like the chat tasks. Each ADMET request is a headless Chrome held for
+# 20-30 s, so admit little more than the browser pool runs; model runs are
+# short, but every batch in flight holds activations in memory.
+admission: Dict[str, AdmissionController] = {
+    "@admet_prediction": _controller("admet", "ADMET", BROWSER_POOL_SIZE, 1, 8, 60.0),
+    "@binding_affinity": _controller("binding", "BINDING", 4, 2, 32, 30.0),
+    "screen": _controller("screen", "SCREEN_ADMISSION", 2, 1, 4, 30.0),
+}
+
+
+@asynccontextmanager
+async def admit(task: Optional[str], username: Optional[str] = None) -> AsyncIterator[None]:
+    """
+    Holds an admission slot for the task for the duration of the block;
+    requests that are not an admission-controlled task pass straight through.
+    Raises AdmissionRejected.
+    """
+    controller = admission.get(task) if task else None
+    if controller is None:
+        yield
+        return
+    async with controller.admit(username):
+        yield
@@ -0,0 +1,171 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from utils.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS objects_accessed_at ON objects (accessed_at);
+CREATE TABLE IF NOT EXISTS artifact_keys (
+    key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL REFERENCES objects (digest) ON DELETE CASCADE,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifact_keys_digest ON artifact_keys (digest);
+"""
+
+
+class ArtifactStore:
+    """
+    Content-addressed files on local disk with a SQLite index.
+
+    Each object is stored once under its SHA-256 (objects/ab/abcdef...), no
+    matter how many keys point at it; keys are whatever the caller looks
+    artifacts up by (e.g. "swissadme-1:<InChIKey>"). Objects not read for
+    max_age seconds are dropped, then the least recently read ones until
+    the store fits in max_bytes.
+
+    Safe to share between threads, and between worker processes on the same
+    disk: files are written atomically and SQLite serializes the index.
+    """
+    def __init__(self, root: str, max_bytes: int, max_age: float):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite3"), timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(SCHEMA)
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        The artifact stored under key, or None if there is none (or it has
+        expired or gone missing from disk).
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT o.digest, o.accessed_at FROM artifact_keys k JOIN objects o ON o.digest = k.digest WHERE k.key = ?",
+                (key,)
+            ).fetchone()
+            if row is not None and row[1] < now - self.max_age:
+                self._delete_object(row[0])
+                row = None
+            if row is not None:
+                self._db.execute("UPDATE objects SET accessed_at = ? WHERE digest = ?", (now, row[0]))
+
+        data = None
+        if row is not None:
+            try:
+                with open(self.path(row[0]), "rb") as handle:
+                    data = handle.read()
+            except FileNotFoundError:
+                with self._lock:
+                    self._delete_object(row[0])
+        record_cache_lookup("admet_artifacts", data is not None)
+        return data
+
+    def put(self, key: str, data: bytes) -> str:
+        """
+        Stores data under key and returns its digest. Identical content
+        already in the store is only indexed again, not written.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            partial = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(partial, "wb") as handle:
+                handle.write(data)
+            os.replace(partial, path)
+
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO objects (digest, size, created_at, accessed_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (digest) DO UPDATE SET accessed_at = excluded.accessed_at",
+                (digest, len(data), now, now)
+            )
+            self._db.execute(
+                "INSERT INTO artifact_keys (key, digest, created_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET digest = excluded.digest, created_at = excluded.created_at",
+                (key, digest, now)
+            )
+        self.prune()
+        return digest
+
+    def prune(self) -> int:
+        """
+        Applies the age and size limits; returns the number of objects removed.
+        """
+        removed = 0
+        with self._lock:
+            expired = self._db.execute(
+                "SELECT digest FROM objects WHERE accessed_at < ?", (time.time() - self.max_age,)
+            ).fetchall()
+            for (digest,) in expired:
+                self._delete_object(digest)
+                removed += 1
+
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+            if total > self.max_bytes:
+                for digest, size in self._db.execute("SELECT digest, size FROM objects ORDER BY accessed_at").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self._delete_object(digest)
+                    total -= size
+                    removed += 1
+        if removed:
+            logger.info("Pruned %d artifacts from %s", removed, self.root)
+        return removed
+
+    def _delete_object(self, digest: str) -> None:
+        # Index first: a reader never finds a key whose file is gone for good
+        self._db.execute("DELETE FROM objects WHERE digest = ?", (digest,))
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            objects, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects").fetchone()
+            keys = self._db.execute("SELECT COUNT(*) FROM artifact_keys").fetchone()[0]
+        return {"objects": objects, "keys": keys, "bytes": total, "max_bytes": self.max_bytes}
+
+
+_admet_artifacts: Optional[ArtifactStore] = None
+_admet_artifacts_lock = threading.Lock()
+
+
+def get_admet_artifacts() -> ArtifactStore:
+    """
+    The store for SwissADME result files, opened on first use.
+    """
+    global _admet_artifacts
+    with _admet_artifacts_lock:
+        if _admet_artifacts is None:
+            _admet_artifacts = ArtifactStore(
+                root=os.getenv("ADMET_ARTIFACT_DIR", "./admet_artifacts"),
+                max_bytes=int(os.getenv("ADMET_ARTIFACT_MAX_BYTES", str(1024 ** 3))),
+                max_age=float(os.getenv("ADMET_ARTIFACT_MAX_AGE", str(30 * 24 * 3600)))
+            )
+        return _admet_artifacts
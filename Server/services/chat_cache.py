@@ -0,0 +1,50 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from utils.metrics import record_cache_lookup
+
+
+class ChatMetadataCache:
+    """
+    Bounded LRU with a TTL for the immutable part of a chat document
+    (chat_id, username, title, created_at), so existence and ownership checks
+    of hot chats do not hit Mongo.
+
+    Only positive results are cached: a chat created by another worker must
+    become visible immediately. Nothing in the server renames or deletes
+    chats, so entries are never invalidated; if that changes, the TTL alone
+    bounds how long a stale entry can be served.
+    """
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, chat_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(chat_id)
+        if entry is not None:
+            expires_at, metadata = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(chat_id)
+                record_cache_lookup("chat_metadata", True)
+                return metadata
+            del self._entries[chat_id]
+        record_cache_lookup("chat_metadata", False)
+        return None
+
+    def put(self, chat_id: str, metadata: Dict[str, Any]) -> None:
+        self._entries[chat_id] = (time.monotonic() + self.ttl, metadata)
+        self._entries.move_to_end(chat_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+chat_metadata_cache = ChatMetadataCache(
+    max_entries=int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "10000")),
+    ttl=float(os.getenv("CHAT_CACHE_TTL", "300"))
+)
@@ -1,16 +1,88 @@
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+import asyncio
+import base64
+import json
+import logging
+import os
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from models.database import chats_collection, messages_collection
-from models.pydantic_models import ChatHistoryItem, MessageModel
+from models.pydantic_models import MessageModel
+from services.chat_cache import chat_metadata_cache
+from services.chat_session import SESSION_HISTORY_LIMIT
+from services.molecule_index import molecule_index
+from services.payload_store import pack_messages, unpack_message
+from services.write_behind import WriteBehindBuffer
+
+MESSAGE_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "chat_id": 1,
+    "role": 1,
+    "content": 1,
+    "content_z": 1,
+    "created_at": 1,
+    "ml_activated": 1,
+    "parameters": 1,
+    "parameters_z": 1
+}
+
+# Messages are totally ordered by (created_at, id), which is also what the
+# (chat_id, created_at, id) index covers.
+MESSAGE_ORDER = [("created_at", 1), ("id", 1)]
+MESSAGE_ORDER_DESC = [("created_at", -1), ("id", -1)]
+
+STREAM_BATCH_SIZE = 100
+
+# Only the fields ChatSession.chat_history keeps
+HISTORY_PROJECTION = {"_id": 0, "role": 1, "content": 1, "content_z": 1}
+
+logger = logging.getLogger(__name__)
+
+# The fields of a chat that never change after creation, which is what
+# chat_metadata_cache holds.
+CHAT_METADATA_PROJECTION = {"_id": 0, "chat_id": 1, "username": 1, "title": 1, "created_at": 1}
+
+# Exactly the fields of ChatHistoryItem
+CHAT_LIST_PROJECTION = {
+    "_id": 0,
+    "chat_id": 1,
+    "title": 1,
+    "username": 1,
+    "created_at": 1,
+    "last_message_at": 1,
+    "last_message_preview": 1
+}
+
+# Newest activity first; chat_id breaks ties so pages never overlap. Chats
+# without messages (last_message_at null) sort last.
+CHAT_LIST_ORDER = [("last_message_at", -1), ("chat_id", -1)]
+# Chats per page when the caller does not ask for a size
+CHAT_LIST_PAGE_SIZE = int(os.getenv("CHAT_LIST_PAGE_SIZE", "50"))
+
+# Opt-in for high-volume deployments: turns are acknowledged before they hit
+# Mongo and written in batches every CHAT_WRITE_BEHIND_INTERVAL seconds.
+write_behind: Optional[WriteBehindBuffer] = None
+if os.getenv("CHAT_WRITE_BEHIND", "0") == "1":
+    write_behind = WriteBehindBuffer(
+        messages_collection,
+        chats_collection,
+        flush_interval=float(os.getenv("CHAT_WRITE_BEHIND_INTERVAL", "1.0")),
+        max_pending=int(os.getenv("CHAT_WRITE_BEHIND_MAX_PENDING", "1000"))
+    )
+
+def _to_millis(value: datetime) -> datetime:
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
 
 async def create_chat(username: str, title: str = "New Chat") -> str:
     """
     Create a new chat and return its ID.
     """
     chat_id = str(uuid.uuid4())
+    # Mongo keeps millisecond precision, cache what a read would return
     now = datetime.utcnow()
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
     
     await chats_collection.insert_one({
         "chat_id": chat_id,
@@ -21,75 +93,272 @@ async def create_chat(username: str, title: str = "New Chat") -> str:
         "last_message_preview": None
     })
     
+    chat_metadata_cache.put(chat_id, {
+        "chat_id": chat_id,
+        "username": username,
+        "title": title,
+        "created_at": now
+    })
+    
     return chat_id
 
-async def get_user_chats(username: str) -> List[ChatHistoryItem]:
+async def get_chat_metadata(chat_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get a chat's id, owner, title and creation time, from the cache when
+    possible. Returns None if the chat does not exist.
+    """
+    metadata = chat_metadata_cache.get(chat_id)
+    if metadata is None:
+        metadata = await chats_collection.find_one({"chat_id": chat_id}, CHAT_METADATA_PROJECTION)
+        if metadata is not None:
+            chat_metadata_cache.put(chat_id, metadata)
+    return metadata
+
+def encode_chat_cursor(last_message_at: Optional[datetime], chat_id: str) -> str:
+    """
+    Builds an opaque pagination cursor pointing at a chat in a user's listing.
+    """
+    raw = json.dumps([last_message_at.isoformat() if last_message_at else None, chat_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_chat_cursor(cursor: str) -> Tuple[Optional[datetime], str]:
+    """
+    Inverse of encode_chat_cursor. Raises ValueError for malformed cursors.
     """
-    Get all chats for a user.
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_message_at, chat_id = json.loads(base64.urlsafe_b64decode(padded))
+        return (datetime.fromisoformat(last_message_at) if last_message_at else None), str(chat_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def chat_list_keyset_filter(username: str, cursor: Optional[str]) -> Dict[str, Any]:
+    query: Dict[str, Any] = {"username": username}
+    if cursor:
+        last_message_at, chat_id = decode_chat_cursor(cursor)
+        if last_message_at is None:
+            # Already in the trailing block of chats without messages
+            query["last_message_at"] = None
+            query["chat_id"] = {"$lt": chat_id}
+        else:
+            query["$or"] = [
+                {"last_message_at": {"$lt": last_message_at}},
+                {"last_message_at": last_message_at, "chat_id": {"$lt": chat_id}},
+                {"last_message_at": None}
+            ]
+    return query
+
+async def get_user_chats_page(
+    username: str,
+    limit: int = CHAT_LIST_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    include_total: bool = False
+) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[int]]:
     """
-    chats = []
-    cursor = chats_collection.find({"username": username}).sort("last_message_at", -1)
+    Get a page of at most `limit` of a user's chats, newest activity first,
+    as plain documents projected to the listed fields. Returns (chats,
+    next_cursor, total); total is only counted when requested.
+    """
+    query = chat_list_keyset_filter(username, cursor)
+    find = chats_collection.find(query, CHAT_LIST_PROJECTION).sort(CHAT_LIST_ORDER).limit(limit + 1)
+    
+    if include_total:
+        chats, total = await asyncio.gather(
+            find.to_list(length=None),
+            chats_collection.count_documents({"username": username})
+        )
+    else:
+        chats, total = await find.to_list(length=None), None
     
-    async for chat in cursor:
-        chats.append(ChatHistoryItem(
-            chat_id=chat["chat_id"],
-            title=chat["title"],
-            username=chat["username"],
-            created_at=chat["created_at"],
-            last_message_at=chat.get("last_message_at"),
-            last_message_preview=chat.get("last_message_preview")
-        ))
+    next_cursor = None
+    if len(chats) > limit:
+        chats = chats[:limit]
+        last = chats[-1]
+        next_cursor = encode_chat_cursor(last.get("last_message_at"), last["chat_id"])
     
-    return chats
+    return chats, next_cursor, total
+
+def _message_preview(content: str) -> str:
+    return content[:50] + "..." if len(content) > 50 else content
 
-async def store_message(
+async def store_turn(
     chat_id: str,
-    role: str,
-    content: str,
+    user_content: str,
+    assistant_content: Optional[str],
     ml_activated: bool = False,
-    parameters: Optional[Dict[str, Any]] = None
-) -> str:
+    parameters: Optional[Dict[str, Any]] = None,
+    user_created_at: Optional[datetime] = None
+) -> Tuple[str, Optional[str]]:
     """
-    Store a message in the database and update chat metadata.
+    Store a user message and the assistant's reply together: both messages
+    go out in one insert_many, concurrently with the chat metadata update
+    (or into the write-behind buffer when it is enabled). Without a reply
+    (the request failed) only the user message is stored.
+    Returns the ids of the user and assistant messages.
     """
-    now = datetime.utcnow()
-    message = MessageModel(
+    now = _to_millis(datetime.utcnow())
+    user_created_at = _to_millis(user_created_at or now)
+    # Mongo keeps milliseconds; make sure the reply still sorts after the
+    # question when both land in the same millisecond
+    now = max(now, user_created_at + timedelta(milliseconds=1))
+    user_message = MessageModel(
         chat_id=chat_id,
-        role=role,
-        content=content,
-        created_at=now,
-        ml_activated=ml_activated,
-        parameters=parameters or {}
+        role="user",
+        content=user_content,
+        created_at=user_created_at
     )
+    raw_documents = [user_message.dict()]
+    assistant_message = None
+    if assistant_content is not None:
+        assistant_message = MessageModel(
+            chat_id=chat_id,
+            role="assistant",
+            content=assistant_content,
+            created_at=now,
+            ml_activated=ml_activated,
+            parameters=parameters or {}
+        )
+        raw_documents.append(assistant_message.dict())
+    documents = await pack_messages(raw_documents)
+    last_message = assistant_message or user_message
+    chat_update = {
+        "last_message_at": last_message.created_at,
+        "last_message_preview": _message_preview(last_message.content)
+    }
     
-    await messages_collection.insert_one(message.dict())
+    if write_behind is not None:
+        await write_behind.add_turn(documents, chat_id, chat_update)
+    else:
+        await asyncio.gather(
+            messages_collection.insert_many(documents),
+            chats_collection.update_one({"chat_id": chat_id}, {"$set": chat_update})
+        )
     
-    preview = content[:50] + "..." if len(content) > 50 else content
-    await chats_collection.update_one(
-        {"chat_id": chat_id},
-        {"$set": {
-            "last_message_at": now,
-            "last_message_preview": preview
-        }}
-    )
+    molecule_index.submit(raw_documents)
     
-    return message.id
+    return user_message.id, assistant_message.id if assistant_message else None
+
+async def flush_pending_writes(chat_id: Optional[str] = None) -> None:
+    """
+    Makes buffered turns visible to readers. With a chat_id, only flushes
+    when that chat has something pending.
+    """
+    if write_behind is None:
+        return
+    if chat_id is None or write_behind.has_pending(chat_id):
+        await write_behind.flush()
 
 async def get_chat_messages(chat_id: str) -> List[MessageModel]:
     """
     Get all messages for a chat.
     """
+    await flush_pending_writes(chat_id)
     messages = []
-    cursor = messages_collection.find({"chat_id": chat_id}).sort("created_at", 1)
+    cursor = messages_collection.find({"chat_id": chat_id}, MESSAGE_PROJECTION).sort(MESSAGE_ORDER)
     
     async for msg in cursor:
-        messages.append(MessageModel(**msg))
+        messages.append(MessageModel(**unpack_message(msg)))
     
     return messages
 
+async def get_recent_history(chat_id: str, limit: int = SESSION_HISTORY_LIMIT) -> List[Dict[str, str]]:
+    """
+    The last `limit` messages of a chat as ChatSession history entries,
+    oldest first. Reads the (chat_id, created_at, id) index backwards, so the
+    cost does not grow with the length of the chat.
+    """
+    await flush_pending_writes(chat_id)
+    cursor = messages_collection.find({"chat_id": chat_id}, HISTORY_PROJECTION).sort(MESSAGE_ORDER_DESC).limit(limit)
+    docs = await cursor.to_list(length=limit)
+    docs.reverse()
+    return [{"role": doc["role"], "content": unpack_message(doc).get("content", "")} for doc in docs]
+
+def encode_message_cursor(created_at: datetime, message_id: str) -> str:
+    """
+    Builds an opaque pagination cursor pointing at a message.
+    """
+    raw = json.dumps([created_at.isoformat(), message_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_message_cursor(cursor: str) -> Tuple[datetime, str]:
+    """
+    Inverse of encode_message_cursor. Raises ValueError for malformed cursors.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, message_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), str(message_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def message_keyset_filter(chat_id: str, cursor: Optional[str], direction: str) -> Dict[str, Any]:
+    query: Dict[str, Any] = {"chat_id": chat_id}
+    if cursor:
+        created_at, message_id = decode_message_cursor(cursor)
+        # The inclusive bound keeps the index scan a single range; the $or
+        # then breaks ties on id between messages sharing a timestamp.
+        query["created_at"] = {"$gte" if direction == "$gt" else "$lte": created_at}
+        query["$or"] = [
+            {"created_at": {direction: created_at}},
+            {"created_at": created_at, "id": {direction: message_id}}
+        ]
+    return query
+
+async def get_chat_message_documents_page(
+    chat_id: str,
+    limit: int = 50,
+    before: Optional[str] = None,
+    after: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[str]]:
+    """
+    Get one page of a chat's message documents in chronological order.
+    With `after`, returns the messages following that cursor; with `before`,
+    the `limit` messages immediately preceding it; with neither, the first page.
+    Returns (documents, prev_cursor, next_cursor); a cursor is None when there
+    is nothing more in that direction.
+    """
+    if before and after:
+        raise ValueError("Use either before or after, not both")
+    
+    await flush_pending_writes(chat_id)
+    
+    if before:
+        query = message_keyset_filter(chat_id, before, "$lt")
+        order = MESSAGE_ORDER_DESC
+    else:
+        query = message_keyset_filter(chat_id, after, "$gt")
+        order = MESSAGE_ORDER
+    
+    # One extra document tells us whether another page exists
+    cursor = messages_collection.find(query, MESSAGE_PROJECTION).sort(order).limit(limit + 1)
+    docs = await cursor.to_list(length=limit + 1)
+    has_more = len(docs) > limit
+    docs = [unpack_message(doc) for doc in docs[:limit]]
+    if before:
+        docs.reverse()
+    
+    if not docs:
+        return docs, None, None
+    
+    first = encode_message_cursor(docs[0]["created_at"], docs[0]["id"])
+    last = encode_message_cursor(docs[-1]["created_at"], docs[-1]["id"])
+    if before:
+        return docs, first if has_more else None, last
+    return docs, first if after else None, last if has_more else None
+
+async def iter_chat_messages(chat_id: str, after: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yields a chat's message documents in chronological order straight from
+    the database cursor, holding at most one batch in memory.
+    """
+    query = message_keyset_filter(chat_id, after, "$gt")
+    await flush_pending_writes(chat_id)
+    cursor = messages_collection.find(query, MESSAGE_PROJECTION).sort(MESSAGE_ORDER).batch_size(STREAM_BATCH_SIZE)
+    async for doc in cursor:
+        yield unpack_message(doc)
+
 async def chat_exists(chat_id: str) -> bool:
     """
     Check if a chat exists.
     """
-    count = await chats_collection.count_documents({"chat_id": chat_id})
-    return count > 0
\ No newline at end of file
+    return await get_chat_metadata(chat_id) is not None
\ No newline at end of file
@@ -1,51 +1,127 @@
-from typing import Dict, List, Optional, Tuple, Any
+from collections import deque
+from types import MappingProxyType
+from typing import Deque, Dict, List, Mapping, Optional, Tuple, Any
+import os
+import sys
 import time
 
+import orjson
+
+# Messages kept in memory per session; older ones stay in Mongo and are not
+# part of the LLM prompt anyway
+SESSION_HISTORY_LIMIT = int(os.getenv("SESSION_HISTORY_LIMIT", "20"))
+
+_EMPTY: Mapping[str, Any] = MappingProxyType({})
+
 class ChatSession:
-    def __init__(self):
-        self.parameters: Dict[str, Any] = {}  # Dynamic parameters storage
+    """
+    Per-chat conversation state. Kept small because thousands of these live
+    in memory at once: no per-instance __dict__, history in a ring buffer of
+    SESSION_HISTORY_LIMIT messages, and every container only allocated once
+    something is put in it. Inference results are cached across sessions by
+    services.inference_cache, not here.
+    """
+    __slots__ = ("_parameters", "_parameter_timestamps", "_history", "history_limit", "ml_activated", "version")
+    
+    def __init__(self, history_limit: int = SESSION_HISTORY_LIMIT):
+        self._parameters: Optional[Dict[str, Any]] = None  # Dynamic parameters storage
+        self._parameter_timestamps: Optional[Dict[str, float]] = None  # Track when parameters were last updated
+        self._history: Optional[Deque[Tuple[str, str]]] = None  # Recent (role, content) pairs, allocated on the first message
+        self.history_limit = history_limit
         self.ml_activated: bool = False
-        self.inference_cache: Dict[Tuple, Any] = {}  # {parameter_hash: inference_result}
-        self.parameter_timestamps: Dict[str, float] = {}  # Track when parameters were last updated
-        self.chat_history: List[Dict[str, str]] = []  # Store conversation history
+        self.version: int = 0  # Bumped by shared session backends on every save
+    
+    @property
+    def parameters(self) -> Mapping[str, Any]:
+        """Read-only view; use update_parameter to change it."""
+        return self._parameters if self._parameters is not None else _EMPTY
+    
+    @property
+    def parameter_timestamps(self) -> Mapping[str, float]:
+        return self._parameter_timestamps if self._parameter_timestamps is not None else _EMPTY
     
     def update_parameter(self, param_name: str, value: Any) -> None:
-        self.parameters[param_name] = value
-        self.parameter_timestamps[param_name] = time.time()
+        if self._parameters is None:
+            self._parameters = {}
+            self._parameter_timestamps = {}
+        self._parameters[param_name] = value
+        self._parameter_timestamps[param_name] = time.time()
     
     def set_ml_activation(self, activated: bool) -> None:
         self.ml_activated = activated
     
     def can_run_inference(self) -> bool:
-        return (self.ml_activated and 
-                'A' in self.parameters and self.parameters['A'] is not None and 
-                'B' in self.parameters and self.parameters['B'] is not None)
-    
-    def get_cache_key(self) -> Tuple:
-        # Create a hashable representation of all parameters
-        param_items = sorted(self.parameters.items())
-        return tuple(param_items)
-    
-    def get_cached_result(self) -> Optional[Any]:
-        key = self.get_cache_key()
-        return self.inference_cache.get(key)
-    
-    def cache_result(self, result: Any) -> None:
-        key = self.get_cache_key()
-        self.inference_cache[key] = result
+        return (self.ml_activated and
+                self.parameters.get('A') is not None and
+                self.parameters.get('B') is not None)
     
     def get_missing_required_parameters(self) -> List[str]:
         missing = []
-        if 'A' not in self.parameters or self.parameters['A'] is None:
+        if self.parameters.get('A') is None:
             missing.append('A')
-        if 'B' not in self.parameters or self.parameters['B'] is None:
+        if self.parameters.get('B') is None:
             missing.append('B')
         return missing
     
     def add_message(self, message: Dict[str, str]) -> None:
-        """Add a message to the chat history."""
-        self.chat_history.append(message)
+        """Add a message to the chat history, dropping the oldest when full."""
+        if self._history is None:
+            self._history = deque(maxlen=self.history_limit)
+        # A tuple is a fraction of the size of the dict; roles are interned
+        self._history.append((sys.intern(message["role"]), message["content"]))
+    
+    def history_checkpoint(self) -> Tuple[Tuple[str, str], ...]:
+        """The current history, for restore_history if a turn fails."""
+        return tuple(self._history) if self._history is not None else ()
+    
+    def restore_history(self, checkpoint: Tuple[Tuple[str, str], ...]) -> None:
+        """Puts the history back as it was at history_checkpoint."""
+        if self._history is not None:
+            self._history.clear()
+            self._history.extend(checkpoint)
     
     def get_chat_history(self) -> List[Dict[str, str]]:
-        """Get the chat history."""
-        return self.chat_history
\ No newline at end of file
+        """Get the chat history, oldest first."""
+        if self._history is None:
+            return []
+        return [{"role": role, "content": content} for role, content in self._history]
+    
+    def approx_size(self) -> int:
+        """Rough number of bytes held by this session, for memory budgeting."""
+        size = 100  # the object itself
+        if self._history is not None:
+            size += 600  # the ring buffer's first block
+            for _, content in self._history:
+                size += 80 + len(content)
+        if self._parameters is not None:
+            size += 400 + 128 * len(self._parameters)
+        return size
+    
+    def to_bytes(self) -> bytes:
+        """
+        Compact JSON form used by shared session backends.
+        """
+        state: Dict[str, Any] = {"m": self.ml_activated, "h": list(self._history or ())}
+        if self._parameters:
+            state["p"] = self._parameters
+            state["t"] = self._parameter_timestamps
+        return orjson.dumps(state, option=orjson.OPT_NON_STR_KEYS)
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ChatSession":
+        state = orjson.loads(data)
+        session = cls()
+        session.ml_activated = state["m"]
+        for entry in state["h"]:
+            # Sessions saved before the history became (role, content) pairs
+            # hold {"role": ..., "content": ...} dicts
+            if isinstance(entry, dict):
+                session.add_message(entry)
+            else:
+                role, content = entry
+                session.add_message({"role": role, "content": content})
+        if state.get("p"):
+            session._parameters = state["p"]
+            session._parameter_timestamps = state.get("t") or {}
+        # A "c" entry, the per-session result cache of older payloads, is ignored
+        return session
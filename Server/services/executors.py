@@ -0,0 +1,86 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+
+from utils.metrics import POOL_SATURATION, POOL_WAIT_SECONDS, register_queue
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class BlockingPool:
+    """
+    A bounded thread pool for one kind of blocking work, so a slow kind
+    (a 30 s browser scrape) cannot take the workers another kind (a Gemini
+    call) needs, and none of them runs on the event loop.
+
+    Jobs run in a copy of the caller's context, so request ids still reach
+    the logs.
+    """
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-pool")
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.active = 0
+
+        register_queue(f"{name}_pool", lambda: self.waiting, lambda: self.active)
+        POOL_SATURATION.labels(name).set_function(lambda: self.active / self.max_workers)
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        context = contextvars.copy_context()
+        submitted = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+
+        def job() -> T:
+            with self._lock:
+                self.waiting -= 1
+                self.active += 1
+            POOL_WAIT_SECONDS.labels(self.name).observe(time.perf_counter() - submitted)
+            try:
+                return context.run(functools.partial(fn, *args, **kwargs))
+            finally:
+                with self._lock:
+                    self.active -= 1
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Gemini calls are network-bound and mostly wait on the LLM scheduler, so
+# this pool can be wide. Model inference runs in threads rather than
+# processes: torch and onnxruntime release the GIL, and one shared Plapt per
+# process is what keeps memory bounded. The browser pool stays small, every
+# job is a headless Chrome; admission control admits as many ADMET requests
+# at once.
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "1"))
+
+pools: Dict[str, BlockingPool] = {
+    "llm": BlockingPool("llm", int(os.getenv("LLM_POOL_SIZE", "32"))),
+    "model": BlockingPool("model", int(os.getenv("MODEL_POOL_SIZE", str(os.cpu_count() or 1)))),
+    "browser": BlockingPool("browser", BROWSER_POOL_SIZE),
+}
+
+
+async def run_blocking(pool: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Runs a blocking call on the named pool ("llm", "model" or "browser")
+    and awaits its result.
+    """
+    return await pools[pool].run(fn, *args, **kwargs)
+
+
+def shutdown_pools() -> None:
+    for pool in pools.values():
+        pool.shutdown()
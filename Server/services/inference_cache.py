@@ -0,0 +1,94 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from utils.metrics import record_cache_lookup
+
+# Part of every key, so results of a replaced model are never served. Bump
+# when the SwissADME output format or the Plapt weights change.
+MODEL_VERSIONS = {
+    "@admet_prediction": os.getenv("ADMET_MODEL_VERSION", "swissadme-1"),
+    "@binding_affinity": os.getenv("PLAPT_MODEL_VERSION", "plapt-1"),
+}
+# Windowed encoding changes the scores of long targets
+if os.getenv("PLAPT_PROTEIN_WINDOW", "0") != "0":
+    MODEL_VERSIONS["@binding_affinity"] += "+window{}/{}".format(
+        os.getenv("PLAPT_PROTEIN_WINDOW"), os.getenv("PLAPT_PROTEIN_WINDOW_OVERLAP", "128")
+    )
+
+
+def normalize_protein_sequence(sequence: str) -> str:
+    """
+    Upper-case one-letter sequence without whitespace, so the same protein
+    pasted with line breaks or in lower case maps to the same key.
+    """
+    return "".join(sequence.split()).upper()
+
+
+def inference_key(task: str, canonical_smiles: str, protein_sequence: str = "") -> Tuple[str, str, str, str]:
+    """
+    (task, model version, canonical SMILES, normalized protein) for one
+    molecule. Callers canonicalize the SMILES (utils.chem_utils.canonicalize_batch).
+    """
+    protein = normalize_protein_sequence(protein_sequence) if protein_sequence else ""
+    return task, MODEL_VERSIONS.get(task, ""), canonical_smiles, protein
+
+
+class InferenceCache:
+    """
+    Process-wide LRU of per-molecule model outputs (ADMET predictions,
+    binding affinities), shared by every chat. Model runs happen in worker
+    threads, hence the lock. `name` labels its lookups in the cache metrics.
+    """
+    def __init__(self, max_entries: int = 10000, name: str = "inference"):
+        self.max_entries = max_entries
+        self.name = name
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: Sequence[Hashable]) -> List[Optional[Any]]:
+        found = []
+        with self._lock:
+            for key in keys:
+                result = self._entries.get(key)
+                if result is not None:
+                    self._entries.move_to_end(key)
+                found.append(result)
+        for result in found:
+            hit = result is not None
+            self.hits += hit
+            self.misses += not hit
+            record_cache_lookup(self.name, hit)
+        return found
+
+    def put(self, key: Hashable, result: Any) -> None:
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None
+        }
+
+
+inference_cache = InferenceCache(max_entries=int(os.getenv("INFERENCE_CACHE_MAX_ENTRIES", "10000")))
+# Bulk screens score tens of thousands of molecules at a time; they get a
+# cache of their own so one screen does not evict every chat's results
+screen_cache = InferenceCache(max_entries=int(os.getenv("SCREEN_CACHE_MAX_ENTRIES", "50000")), name="screen")
@@ -0,0 +1,242 @@
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+import httpx
+from google import genai
+from google.genai import errors, types
+
+from utils.metrics import register_queue, track_stage
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0  # /chat turns, someone is waiting on the answer
+PRIORITY_BATCH = 1  # /summary articles and other background generation
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")  # point at loadtest/fake_gemini.py for local runs
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailableError(Exception):
+    """
+    Raised when a Gemini call could not be completed within the queueing
+    deadline, either because the scheduler stayed saturated or because the
+    API kept answering with quota / server errors.
+    """
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMRequestError(Exception):
+    """
+    Raised when Gemini failed a request in a way retrying will not fix (a
+    rejected prompt, bad credentials, an unexpected SDK error), instead of
+    passing an empty answer on as if it were one. Answered with 502.
+    """
+
+
+class TokenBucket:
+    """
+    Classic token bucket. Not thread-safe on its own; the scheduler calls it
+    while holding its condition lock.
+    """
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_take(self) -> float:
+        """
+        Takes a token if one is available and returns 0, otherwise returns
+        the number of seconds until the next token is due.
+        """
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class LLMScheduler:
+    """
+    Central gate for every Gemini request: bounded concurrency, a token bucket
+    for the per-minute quota, priority ordering of waiters and retries with
+    full-jitter exponential backoff on 429/5xx responses.
+
+    Calls are blocking, so it can be used from the synchronous service code
+    (and from worker threads) without an event loop.
+    """
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        requests_per_minute: float = 60,
+        burst: int = 10,
+        max_retries: int = 4,
+        base_backoff: float = 0.5,
+        max_backoff: float = 16.0,
+        max_queue_wait: float = 60.0
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_queue_wait = max_queue_wait
+
+        self._bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self._cond = threading.Condition()
+        self._waiting: List[Tuple[int, int]] = []  # heap of (priority, ticket)
+        self._tickets = itertools.count()
+        self._active = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiting)
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def _acquire(self, priority: int, deadline: float) -> None:
+        with self._cond:
+            entry = (priority, next(self._tickets))
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    wait = None
+                    if self._waiting[0] == entry and self._active < self.max_concurrency:
+                        wait = self._bucket.try_take()
+                        if wait == 0:
+                            heapq.heappop(self._waiting)
+                            self._active += 1
+                            # The next waiter may be able to go right away
+                            self._cond.notify_all()
+                            return
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise LLMUnavailableError(
+                            "The language model is busy, please retry shortly.",
+                            retry_after=max(1.0, wait or 1.0)
+                        )
+                    self._cond.wait(timeout=min(wait, remaining) if wait else remaining)
+            except BaseException:
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                raise
+
+    def _release(self) -> None:
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+
+    def submit(self, fn: Callable[[], Any], priority: int = PRIORITY_INTERACTIVE) -> Any:
+        """
+        Runs fn once a slot and a rate-limit token are available, retrying
+        retryable API errors. Non-retryable errors are re-raised unchanged.
+        """
+        deadline = time.monotonic() + self.max_queue_wait
+        attempt = 0
+        while True:
+            with track_stage("llm_queue_wait"):
+                self._acquire(priority, deadline)
+            try:
+                return fn()
+            except Exception as e:
+                if not is_retryable_error(e):
+                    raise
+                if attempt >= self.max_retries:
+                    raise LLMUnavailableError(
+                        "The language model is over capacity, please retry shortly.",
+                        retry_after=self.max_backoff
+                    ) from e
+                last_error = e
+            finally:
+                self._release()
+
+            delay = self._backoff(attempt)
+            attempt += 1
+            if time.monotonic() + delay > deadline:
+                raise LLMUnavailableError(
+                    "The language model is over capacity, please retry shortly.",
+                    retry_after=max(1.0, delay)
+                ) from last_error
+            logger.warning("Gemini call failed (%s), retry %d/%d in %.2fs", last_error, attempt, self.max_retries, delay)
+            time.sleep(delay)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS_CODES
+    # Network level failures from the SDK's HTTP client (httpx), which do not
+    # derive from the builtin ConnectionError / TimeoutError
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+
+scheduler = LLMScheduler(
+    max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+    requests_per_minute=float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60")),
+    burst=int(os.getenv("GEMINI_BURST", "10")),
+    max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "4")),
+    max_queue_wait=float(os.getenv("GEMINI_MAX_QUEUE_WAIT", "60"))
+)
+register_queue("gemini", lambda: scheduler.queue_depth, lambda: scheduler.active)
+
+_client: Optional[genai.Client] = None
+_client_lock = threading.Lock()
+
+
+def get_gemini_client(api_key: Optional[str] = None) -> genai.Client:
+    """
+    Returns the shared Gemini client, creating it on first use.
+    """
+    global _client
+    if api_key is not None:
+        return _make_client(api_key)
+    with _client_lock:
+        if _client is None:
+            _client = _make_client(os.environ.get("GEMINI_API_KEY"))
+        return _client
+
+
+def _make_client(api_key: Optional[str]) -> genai.Client:
+    if not api_key:
+        raise ValueError("Gemini API key is required. Set it as an environment variable or pass it to the constructor.")
+    http_options = types.HttpOptions(base_url=GEMINI_BASE_URL) if GEMINI_BASE_URL else None
+    return genai.Client(api_key=api_key, http_options=http_options)
+
+
+def generate_content(
+    prompt: str,
+    priority: int = PRIORITY_INTERACTIVE,
+    client: Optional[genai.Client] = None,
+    model: str = GEMINI_MODEL
+) -> str:
+    """
+    Sends a prompt through the scheduler and returns the response text
+    ("" if the model returned no text).
+    """
+    client = client or get_gemini_client()
+    response = scheduler.submit(
+        lambda: client.models.generate_content(model=model, contents=prompt),
+        priority=priority
+    )
+    return response.text or ""
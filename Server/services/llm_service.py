@@ -1,43 +1,45 @@
 import json
+import logging
 from typing import Dict, Any, Tuple, Optional
-import os
 import time
-from google import genai
 
 from services.chat_session import ChatSession
-from utils.chem_utils import validate_smiles
+from utils.chem_utils import canonicalize, canonicalize_batch
+from services.executors import run_blocking
 from services.ml_service import run_ml_model, call_gemini_api
+from services.llm_scheduler import (
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    LLMRequestError,
+    LLMUnavailableError,
+    generate_content,
+    get_gemini_client,
+    GEMINI_MODEL
+)
+from utils.metrics import track_stage
+
+logger = logging.getLogger(__name__)
 
 class LLMService:
     def __init__(self, api_key=None):
         """Initialize the LLM service with Gemini API."""
-        if api_key is None:
-            api_key = os.environ.get("GEMINI_API_KEY")
-            
-        if not api_key:
-            raise ValueError("Gemini API key is required. Set it as an environment variable or pass it to the constructor.")
-            
-        self.client = genai.Client(api_key=api_key)
-        self.model = "gemini-2.0-flash"
+        self.client = get_gemini_client(api_key)
+        self.model = GEMINI_MODEL
         
-    def call_llm_api(self, prompt: str) -> str:
+    def call_llm_api(self, prompt: str, priority: int = PRIORITY_INTERACTIVE) -> str:
         """
-        Calls the Gemini API with the given prompt.
-        Returns the LLM's response as a string.
+        Calls the Gemini API with the given prompt through the shared scheduler.
+        Returns the LLM's response as a string. Raises LLMUnavailableError
+        when the request could not be served in time and LLMRequestError when
+        it failed for good.
         """
         try:
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt 
-            )
-            
-            if response.text:
-                return response.text
-            else:
-                return ""
+            return generate_content(prompt, priority=priority, client=self.client, model=self.model)
+        except LLMUnavailableError:
+            raise
         except Exception as e:
-            print(f"Error calling Gemini API: {e}")
-            return ""
+            logger.error("Error calling Gemini API: %s", e)
+            raise LLMRequestError("The language model could not answer this request.") from e
 
     def extract_smiles_with_llm(self, user_message: str) -> Dict[str, str]:
         """
@@ -69,14 +71,15 @@ class LLMService:
             else:
                 smiles_list = []
             
-            valid_smiles = [smiles for smiles in smiles_list if validate_smiles(smiles)]
+            records = canonicalize_batch(smiles for smiles in smiles_list if isinstance(smiles, str))
+            valid_smiles = [record.smiles for record in records if record]
             
             return {"smiles": valid_smiles}
         except json.JSONDecodeError:
-            print("Failed to parse JSON from LLM response")
+            logger.warning("Failed to parse JSON from LLM response")
             return {"smiles": []}
         except Exception as e:
-            print(f"Error extracting SMILES: {e}")
+            logger.error("Error extracting SMILES: %s", e)
             return {"smiles": []}
 
     def extract_protein_and_smiles_with_llm(self, user_message: str) -> Dict[str, Any]:
@@ -117,18 +120,18 @@ class LLMService:
                 protein_sequence = ""
                 smiles = ""
             
-            if smiles and not validate_smiles(smiles):
-                smiles = ""
+            record = canonicalize(smiles) if isinstance(smiles, str) and smiles else None
+            smiles = record.smiles if record else ""
             
             return {
                 "protein_sequence": protein_sequence,
                 "smiles": smiles
             }
         except json.JSONDecodeError:
-            print("Failed to parse JSON from LLM response")
+            logger.warning("Failed to parse JSON from LLM response")
             return {"protein_sequence": "", "smiles": ""}
         except Exception as e:
-            print(f"Error extracting protein and SMILES: {e}")
+            logger.error("Error extracting protein and SMILES: %s", e)
             return {"protein_sequence": "", "smiles": ""}
 
     def generate_llm_response(self, user_message: str, chat_history=None) -> str:
@@ -157,17 +160,16 @@ class LLMService:
         prompt += f"User: {user_message}\n\nAssistant: "
         
         try:
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt
-            )
+            response_text = generate_content(prompt, client=self.client, model=self.model)
             
-            if response.text:
-                return response.text
+            if response_text:
+                return response_text
             else:
                 return "I apologize, but I couldn't generate a response. Please try again."
+        except LLMUnavailableError:
+            raise
         except Exception as e:
-            print(f"Error generating response: {e}")
+            logger.error("Error generating response: %s", e)
             return "I encountered an error while processing your request. Please try again."
 
 llm_service = None
@@ -179,6 +181,21 @@ def get_llm_service(api_key=None):
         llm_service = LLMService(api_key)
     return llm_service
 
+ML_TASKS = {
+    "@admet_prediction": "ADMET Prediction",
+    "@binding_affinity": "Binding Affinity Prediction",
+}
+
+def detect_ml_task(user_message: str) -> Optional[str]:
+    """
+    The ML task tag (e.g. "@admet_prediction") a message asks for, if any.
+    """
+    message = user_message.lower()
+    for task_key in ML_TASKS:
+        if task_key in message:
+            return task_key
+    return None
+
 async def process_message(user_message: str, session: ChatSession, ml_button_clicked: bool = False) -> Tuple[str, Dict[str, Any]]:
     """
     Processes a user message and returns an appropriate response.
@@ -189,20 +206,12 @@ async def process_message(user_message: str, session: ChatSession, ml_button_cli
     if hasattr(session, 'add_message'):
         session.add_message({"role": "user", "content": user_message})
     
-    ml_tasks = {
-        "@admet_prediction": "ADMET Prediction",
-        "@binding_affinity": "Binding Affinity Prediction",
-    }
-    
-    detected_task = None
-    for task_key in ml_tasks.keys():
-        if task_key in user_message.lower():
-            detected_task = task_key
-            break
+    detected_task = detect_ml_task(user_message)
     
     if detected_task:
         if detected_task == "@binding_affinity":
-            extracted_data = service.extract_protein_and_smiles_with_llm(user_message)
+            with track_stage("llm_extraction"):
+                extracted_data = await run_blocking("llm", service.extract_protein_and_smiles_with_llm, user_message)
             protein_sequence = extracted_data.get("protein_sequence", "")
             smiles = extracted_data.get("smiles", "")
             
@@ -213,14 +222,15 @@ async def process_message(user_message: str, session: ChatSession, ml_button_cli
                 return "No valid SMILES string found. Please provide a valid SMILES string for binding affinity prediction.", {}
             
             try:
-                result = run_ml_model({
-                    "task": detected_task,
-                    "protein_sequence": protein_sequence,
-                    "smiles": [smiles]
-                })
+                with track_stage("run_ml_model"):
+                    result = await run_ml_model({
+                        "task": detected_task,
+                        "protein_sequence": protein_sequence,
+                        "smiles": [smiles]
+                    })
                 
                 ml_response = {
-                    "task": ml_tasks[detected_task],
+                    "task": ML_TASKS[detected_task],
                     "protein_sequence": protein_sequence,
                     "smiles": smiles,
                     "result": result,
@@ -230,27 +240,29 @@ async def process_message(user_message: str, session: ChatSession, ml_button_cli
                 if hasattr(session, 'add_ml_result'):
                     session.add_ml_result(ml_response)
                 
-                response = f"{ml_tasks[detected_task]} Results:\n"
+                response = f"{ML_TASKS[detected_task]} Results:\n"
                 response += f"Protein: {protein_sequence[:30]}...\n" if len(protein_sequence) > 30 else f"Protein: {protein_sequence}\n"
                 response += f"SMILES: {smiles}\n"
                 response += f"Prediction: {result}"
             except Exception as e:
-                response = f"Error running {ml_tasks[detected_task]} model: {str(e)}"
+                response = f"Error running {ML_TASKS[detected_task]} model: {str(e)}"
         else:
-            extracted_data = service.extract_smiles_with_llm(user_message)
+            with track_stage("llm_extraction"):
+                extracted_data = await run_blocking("llm", service.extract_smiles_with_llm, user_message)
             smiles_list = extracted_data.get("smiles", [])
             
             if not smiles_list:
                 return "No valid SMILES strings found. Please provide valid SMILES strings.", {}
             
             try:
-                result = run_ml_model({
-                    "task": detected_task,
-                    "smiles": smiles_list
-                })
+                with track_stage("run_ml_model"):
+                    result = await run_ml_model({
+                        "task": detected_task,
+                        "smiles": smiles_list
+                    })
                 
                 ml_response = {
-                    "task": ml_tasks[detected_task],
+                    "task": ML_TASKS[detected_task],
                     "smiles": smiles_list,
                     "result": result,
                     "timestamp": time.time()
@@ -259,15 +271,15 @@ async def process_message(user_message: str, session: ChatSession, ml_button_cli
                 if hasattr(session, 'add_ml_result'):
                     session.add_ml_result(ml_response)
                 
-                response = f"{ml_tasks[detected_task]} Results:\n"
+                response = f"{ML_TASKS[detected_task]} Results:\n"
                 response += f"SMILES: {', '.join(smiles_list)}\n"
                 response += f"Prediction: {result}"
             except Exception as e:
-                response = f"Error running {ml_tasks[detected_task]} model: {str(e)}"
+                response = f"Error running {ML_TASKS[detected_task]} model: {str(e)}"
     else:
         chat_history = session.get_chat_history() if hasattr(session, 'get_chat_history') else []
-        breakpoint()
-        response = service.generate_llm_response(user_message, chat_history)
+        with track_stage("llm_chat_response"):
+            response = await run_blocking("llm", service.generate_llm_response, user_message, chat_history)
     
     if hasattr(session, 'add_message'):
         session.add_message({"role": "assistant", "content": response})
@@ -306,7 +318,8 @@ async def generate_chat_summary(messages: list) -> dict:
     conversation, and maintains a professional tone suitable for a scientific audience.
     """
     
-    response = call_gemini_api(prompt)
+    with track_stage("llm_summary"):
+        response = await run_blocking("llm", call_gemini_api, prompt, priority=PRIORITY_BATCH)
     
     try:
         title_marker = "TITLE: "
@@ -330,7 +343,7 @@ async def generate_chat_summary(messages: list) -> dict:
             "content": content
         }
     except Exception as e:
-        print(f"Error processing article response: {e}")
+        logger.error("Error processing article response: %s", e)
         return {
             "title": "Article Summary (Error Occurred)",
             "content": "An error occurred while generating the article. Please try again."
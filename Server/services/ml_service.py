@@ -1,91 +1,232 @@
-from typing import Dict, Any, Tuple, List
+from typing import TYPE_CHECKING, Dict, Any, Tuple, List, Optional
+import logging
+import threading
 import uuid
-import pandas as pd
 import os
+import io
 import json
-from google import genai
-from admet.scrape import automate_download
-from binding_affinity.plapt import Plapt
+import hashlib
+import tempfile
+from services.artifact_store import get_admet_artifacts
+from services.executors import run_blocking
+from services.inference_cache import MODEL_VERSIONS, InferenceCache, inference_cache, inference_key, normalize_protein_sequence
+from services.llm_scheduler import PRIORITY_INTERACTIVE, LLMRequestError, LLMUnavailableError, generate_content
+from utils.chem_utils import canonicalize, canonicalize_batch
+from utils.metrics import track_model_load, track_stage
 
-def call_gemini_api(prompt: str) -> str:
+# torch, transformers, onnxruntime, selenium and pandas are only imported on
+# first use (or by the warm-up task), so pods that never run a model start
+# fast and stay small.
+if TYPE_CHECKING:
+    import pandas as pd
+    from binding_affinity.plapt import Plapt
+
+logger = logging.getLogger(__name__)
+
+# Opt-in sliding-window encoding of long targets (tokens per window; 0 = off),
+# see Plapt.encode_protein_windowed
+PLAPT_PROTEIN_WINDOW = int(os.getenv("PLAPT_PROTEIN_WINDOW", "0")) or None
+PLAPT_PROTEIN_WINDOW_OVERLAP = int(os.getenv("PLAPT_PROTEIN_WINDOW_OVERLAP", "128"))
+PLAPT_PROTEIN_WINDOW_BATCH = int(os.getenv("PLAPT_PROTEIN_WINDOW_BATCH", "4"))
+# Directory built by binding_affinity.target_library; known targets skip ProtBert
+PLAPT_TARGET_LIBRARY = os.getenv("PLAPT_TARGET_LIBRARY") or None
+
+_plapt = None
+_plapt_lock = threading.Lock()
+
+def get_plapt() -> "Plapt":
+    """
+    The process-wide Plapt instance, loaded on first call. Loading takes
+    seconds and several GB, so it is never done per request.
+    """
+    global _plapt
+    if _plapt is None:
+        with _plapt_lock:
+            if _plapt is None:
+                from binding_affinity.plapt import Plapt
+                with track_model_load("plapt"):
+                    _plapt = Plapt(
+                        use_tqdm=False,
+                        protein_window=PLAPT_PROTEIN_WINDOW,
+                        protein_window_overlap=PLAPT_PROTEIN_WINDOW_OVERLAP,
+                        protein_window_batch=PLAPT_PROTEIN_WINDOW_BATCH,
+                        target_library=PLAPT_TARGET_LIBRARY
+                    )
+    return _plapt
+
+def plapt_loaded() -> bool:
+    return _plapt is not None
+
+def get_admet_scraper():
+    """
+    Imports the SwissADME scraper (selenium, pandas) on first use.
+    """
+    from admet.scrape import automate_download
+    return automate_download
+
+def call_gemini_api(prompt: str, priority: int = PRIORITY_INTERACTIVE) -> str:
     """
-    Calls the Gemini API directly with the given prompt.
+    Calls the Gemini API through the shared scheduler with the given prompt.
     Returns the LLM's response as a string.
+    Raises LLMUnavailableError when the request could not be served in time
+    and LLMRequestError when it failed for good.
     """
     try:
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("Gemini API key is required as environment variable.")
-            
-        client = genai.Client(api_key=api_key)
-        model = "gemini-2.0-flash"
-        
-        response = client.models.generate_content(
-            model=model,
-            contents=prompt
-        )
-        
-        if response.text:
-            return response.text
-        else:
-            return ""
+        return generate_content(prompt, priority=priority)
+    except LLMUnavailableError:
+        raise
     except Exception as e:
-        print(f"Error calling Gemini API: {e}")
-        return ""
+        logger.error("Error calling Gemini API: %s", e)
+        raise LLMRequestError("The language model could not answer this request.") from e
 
-def run_ml_model(parameters: Dict[str, Any]) -> str:
+async def run_ml_model(parameters: Dict[str, Any]) -> str:
     """
     Runs the appropriate ML model based on the task specified in parameters.
-    Returns a user-friendly explanation of the results.
+    Returns a user-friendly explanation of the results. Scrapes, model runs
+    and LLM calls each go to their own executor pool.
     """
     task = parameters.get("task", "").lower()
-    smiles_list = parameters.get("smiles", [])
+    # Everything downstream (cache keys, SwissADME input, Plapt's embedding
+    # cache, prompts) sees the canonical form
+    records = await run_blocking("model", canonicalize_batch, parameters.get("smiles", []))
+    smiles_list = [record.smiles for record in records if record]
     
     if not smiles_list:
         return "Error: No valid SMILES strings provided for prediction."
     
     if "@admet_prediction" in task:
-        return run_admet_prediction(smiles_list)
+        return await run_admet_prediction(smiles_list)
     elif "@binding_affinity" in task:
         protein_sequence = parameters.get("protein_sequence", "")
         if not protein_sequence:
             return "Error: No protein sequence provided for binding affinity prediction."
-        return run_binding_affinity_prediction(protein_sequence, smiles_list)
+        return await run_binding_affinity_prediction(protein_sequence, smiles_list)
     else:
         return f"Unknown task: {task}"
 
-def run_admet_prediction(smiles_list: list) -> str:
+def admet_artifact_key(smiles: str) -> str:
     """
-    Runs ADMET prediction for the given SMILES strings and generates
-    a user-friendly explanation of the results.
+    Artifact store key of a molecule's SwissADME file: the model version and
+    the InChIKey (a hash of the SMILES when RDKit cannot make one).
+    """
+    record = canonicalize(smiles)
+    identity = record.inchikey if record is not None and record.inchikey else hashlib.sha256(smiles.encode()).hexdigest()
+    return f"{MODEL_VERSIONS['@admet_prediction']}:{identity}"
+
+def load_admet_artifact(smiles: str) -> Optional[Dict[str, Any]]:
+    """
+    Key predictions from a SwissADME file scraped earlier, if the artifact
+    store still has one for the molecule.
+    """
+    data = get_admet_artifacts().get(admet_artifact_key(smiles))
+    if data is None:
+        return None
+    import pandas as pd
+    return extract_key_admet_predictions(pd.read_csv(io.BytesIO(data)))
+
+def scrape_admet_predictions(smiles: str) -> Optional[Dict[str, Any]]:
+    """
+    Runs a SwissADME session for one molecule in a download directory of its
+    own, keeps the result file in the artifact store and extracts the key
+    predictions. Blocking; runs on the browser pool.
     """
     unique_id = str(uuid.uuid4())[:8]
+    automate_download = get_admet_scraper()
+    with tempfile.TemporaryDirectory(prefix="swissadme-") as download_dir:
+        with track_stage("admet_scrape"):
+            df, _, path = automate_download(unique_id, smiles, download_dir)
+        
+        if df is None:
+            return None
+        if path is not None:
+            with open(path, "rb") as handle:
+                data = handle.read()
+        else:
+            data = df.to_csv(index=False).encode("utf-8")
     
+    get_admet_artifacts().put(admet_artifact_key(smiles), data)
+    return extract_key_admet_predictions(df)
+
+async def run_admet_prediction(smiles_list: list) -> str:
+    """
+    Runs ADMET prediction for the given canonical SMILES strings and generates
+    a user-friendly explanation of the results.
+    """
     smiles = smiles_list[0] if smiles_list else ""
     
     try:
-        df, _, _ = automate_download(unique_id, smiles)
-        
-        if df is None:
-            return "Failed to generate ADMET predictions. Please try again later."
+        key = inference_key("@admet_prediction", smiles)
+        predictions = inference_cache.get(key)
+        if predictions is None:
+            # A file read and a CSV parse: short, so it does not wait behind
+            # browser sessions
+            predictions = await run_blocking("model", load_admet_artifact, smiles)
+        if predictions is None:
+            predictions = await run_blocking("browser", scrape_admet_predictions, smiles)
+            
+            if predictions is None:
+                return "Failed to generate ADMET predictions. Please try again later."
         
-        predictions = extract_key_admet_predictions(df)
+        inference_cache.put(key, predictions)
         
-        return generate_admet_explanation(smiles, predictions)
+        return await run_blocking("llm", generate_admet_explanation, smiles, predictions)
     
     except Exception as e:
         return f"Error generating ADMET predictions: {str(e)}"
 
-def run_binding_affinity_prediction(protein_sequence: str, smiles_list: List[str]) -> str:
+def score_with_plapt(protein_sequence: str, smiles_list: List[str]) -> List[Dict[str, float]]:
     """
-    Runs binding affinity prediction for the given protein sequence and SMILES strings
-    and generates a user-friendly explanation of the results.
+    Scores molecules against a target with the shared Plapt model. Blocking;
+    runs on the model pool.
     """
+    model = get_plapt()
+    with track_stage("plapt_score"):
+        return model.score_candidates(protein_sequence, smiles_list)
+
+async def score_binding_affinities(
+    protein_sequence: str,
+    smiles_list: List[str],
+    batch_size: int = 0,
+    cache: InferenceCache = inference_cache
+) -> Optional[List[Dict[str, float]]]:
+    """
+    Binding affinity of each canonical SMILES against a normalized target,
+    from `cache` where possible. Only molecules never scored
+    against this target reach the model, once per distinct structure and
+    batch_size at a time (all at once when 0). Returns None if the model
+    produced no predictions.
+    """
+    keys = [inference_key("@binding_affinity", smiles, protein_sequence) for smiles in smiles_list]
+    results = cache.get_many(keys)
+    missing: Dict[Tuple, int] = {}
+    for i, result in enumerate(results):
+        if result is None:
+            missing.setdefault(keys[i], i)
+    if not missing:
+        return results
+    
+    todo = list(missing.items())
+    step = batch_size or len(todo)
+    scored_by_key: Dict[Tuple, Dict[str, float]] = {}
+    for start in range(0, len(todo), step):
+        batch = todo[start:start + step]
+        scored = await run_blocking("model", score_with_plapt, protein_sequence, [smiles_list[i] for _, i in batch])
+        if not scored:
+            return None
+        for (key, _), result in zip(batch, scored):
+            cache.put(key, result)
+            scored_by_key[key] = result
+    
+    return [result if result is not None else scored_by_key[key] for key, result in zip(keys, results)]
+
+async def run_binding_affinity_prediction(protein_sequence: str, smiles_list: List[str]) -> str:
+    """
+    Runs binding affinity prediction for the given protein sequence and canonical
+    SMILES strings and generates a user-friendly explanation of the results.
+    """
+    protein_sequence = normalize_protein_sequence(protein_sequence)
     try:
-        model = Plapt(use_tqdm=False)
-        
-        results = model.score_candidates(protein_sequence, smiles_list)
-        
+        results = await score_binding_affinities(protein_sequence, smiles_list)
         if not results:
             return "Failed to generate binding affinity predictions. Please try again later."
         
@@ -97,12 +238,12 @@ def run_binding_affinity_prediction(protein_sequence: str, smiles_list: List[str
                 "affinity_uM": result["affinity_uM"]
             })
         
-        return generate_binding_affinity_explanation(protein_sequence, formatted_results)
+        return await run_blocking("llm", generate_binding_affinity_explanation, protein_sequence, formatted_results)
     
     except Exception as e:
         return f"Error generating binding affinity predictions: {str(e)}"
 
-def extract_key_admet_predictions(df: pd.DataFrame) -> Dict[str, Any]:
+def extract_key_admet_predictions(df: "pd.DataFrame") -> Dict[str, Any]:
     """
     Extracts key ADMET predictions from the dataframe.
     Returns a dictionary of important predictions.
@@ -191,10 +332,13 @@ def generate_admet_explanation(smiles: str, predictions: Dict[str, Any]) -> str:
     
     """
     try:
-        explanation = call_gemini_api(prompt)
+        with track_stage("llm_explanation"):
+            explanation = call_gemini_api(prompt)
+        if not explanation:
+            raise ValueError("empty response from Gemini")
         return explanation
     except Exception as e:
-        print(f"Error generating explanation: {e}")
+        logger.error("Error generating explanation: %s", e)
         return f"ADMET Predictions for {smiles}:\n\n{pred_text}"
 
 def generate_binding_affinity_explanation(protein_sequence: str, predictions: List[Dict[str, Any]]) -> str:
@@ -230,8 +374,11 @@ def generate_binding_affinity_explanation(protein_sequence: str, predictions: Li
     """
     
     try:
-        explanation = call_gemini_api(prompt)
+        with track_stage("llm_explanation"):
+            explanation = call_gemini_api(prompt)
+        if not explanation:
+            raise ValueError("empty response from Gemini")
         return f"Binding Affinity Predictions for Protein-Ligand Interactions:\n\n{explanation}"
     except Exception as e:
-        print(f"Error generating explanation: {e}")
+        logger.error("Error generating explanation: %s", e)
         return f"Binding Affinity Predictions:\n\n{pred_text}"
\ No newline at end of file
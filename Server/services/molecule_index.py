@@ -0,0 +1,355 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from bson import Binary
+from pymongo import UpdateOne
+
+from models.database import chats_collection, molecule_mentions_collection, molecules_collection
+from services.chat_cache import chat_metadata_cache
+from services.executors import run_blocking
+from utils.chem_utils import (
+    FINGERPRINT_BITS,
+    CanonicalSmiles,
+    MoleculeRecord,
+    canonicalize,
+    canonicalize_batch,
+    describe_molecule,
+    find_smiles_in_text,
+    molecule_fingerprint
+)
+from utils.metrics import register_queue, track_stage
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_WORDS = FINGERPRINT_BITS // 64
+SEARCH_CHUNK_ROWS = 16384
+
+# Stored messages wait at most this long to be indexed, in batches of up to
+# INDEX_BATCH_SIZE. Indexing is best effort: beyond INDEX_MAX_PENDING queued
+# messages new ones are skipped rather than held in memory.
+INDEX_INTERVAL = float(os.getenv("MOLECULE_INDEX_INTERVAL", "1.0"))
+INDEX_BATCH_SIZE = 500
+INDEX_MAX_PENDING = int(os.getenv("MOLECULE_INDEX_MAX_PENDING", "10000"))
+
+
+class FingerprintMatrix:
+    """
+    In-memory copy of every indexed fingerprint as a (rows x words) uint64
+    matrix, grown by doubling, so a similarity query is a couple of
+    vectorized passes over contiguous memory.
+    """
+    def __init__(self, initial_capacity: int = 1024):
+        self._bits = np.zeros((initial_capacity, FINGERPRINT_WORDS), dtype=np.uint64)
+        self._counts = np.zeros(initial_capacity, dtype=np.int32)
+        self.keys: List[str] = []
+        self.smiles: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, inchikey: str) -> bool:
+        return inchikey in self._rows
+
+    def add(self, inchikey: str, smiles: str, fingerprint: bytes) -> None:
+        if inchikey in self._rows:
+            return
+        row = len(self.keys)
+        if row == len(self._bits):
+            self._bits = np.concatenate([self._bits, np.zeros_like(self._bits)])
+            self._counts = np.concatenate([self._counts, np.zeros_like(self._counts)])
+        words = np.frombuffer(fingerprint, dtype=np.uint64)
+        self._bits[row] = words
+        self._counts[row] = int(np.bitwise_count(words).sum())
+        self._rows[inchikey] = row
+        self.keys.append(inchikey)
+        self.smiles.append(smiles)
+
+    def search(self, fingerprint: bytes, threshold: float, limit: int) -> List[Tuple[str, str, float]]:
+        """
+        Returns up to `limit` (inchikey, smiles, tanimoto) with similarity of
+        at least `threshold`, most similar first.
+        """
+        # Runs on the model pool while the event loop may add rows: work on
+        # the rows and arrays present now
+        size = len(self.keys)
+        if size == 0:
+            return []
+        bits, counts = self._bits, self._counts
+        query = np.frombuffer(fingerprint, dtype=np.uint64)
+        query_count = int(np.bitwise_count(query).sum())
+
+        # Chunked so the temporaries stay cache-sized
+        common = np.empty(size, dtype=np.int32)
+        for start in range(0, size, SEARCH_CHUNK_ROWS):
+            end = min(size, start + SEARCH_CHUNK_ROWS)
+            np.bitwise_count(bits[start:end] & query).sum(axis=1, dtype=np.int32, out=common[start:end])
+        union = counts[:size] + query_count - common
+        scores = np.divide(common, union, out=np.zeros(size, dtype=np.float32), where=union > 0)
+
+        candidates = np.flatnonzero(scores >= threshold)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(scores[candidates], -limit)[-limit:]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self.keys[i], self.smiles[i], float(scores[i])) for i in candidates]
+
+
+class MoleculeIndex:
+    """
+    Maps InChIKeys to the chat messages mentioning them and answers exact
+    and Tanimoto similarity queries.
+
+    Mongo holds one document per molecule (canonical SMILES, fingerprint) and
+    one per mention (inchikey, username, chat_id, message_id); the
+    fingerprints are mirrored into a FingerprintMatrix loaded at startup.
+
+    Stored messages are queued with submit() and indexed off the request
+    path: a background task parses them on the model pool and writes each
+    batch with one bulk_write per collection.
+    """
+    def __init__(self):
+        self.matrix = FingerprintMatrix()
+        self.loaded = False
+        self._load_lock = asyncio.Lock()
+        self._pending: List[Dict[str, Any]] = []
+        self._index_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def load(self, batch_size: int = 5000) -> None:
+        async with self._load_lock:
+            if self.loaded:
+                return
+            with track_stage("molecule_index_load"):
+                cursor = molecules_collection.find({}, {"smiles": 1, "fp": 1}).batch_size(batch_size)
+                async for doc in cursor:
+                    self.matrix.add(doc["_id"], doc["smiles"], bytes(doc["fp"]))
+            self.loaded = True
+            logger.info("Molecule index loaded with %d molecules", len(self.matrix))
+
+    def submit(self, messages: List[Dict[str, Any]]) -> None:
+        """
+        Queues freshly stored messages for indexing.
+        """
+        room = INDEX_MAX_PENDING - len(self._pending)
+        if room < len(messages):
+            logger.warning("Molecule index queue full, skipping %d messages", len(messages) - max(room, 0))
+        self._pending.extend(messages[:max(room, 0)])
+
+    async def index_pending(self) -> None:
+        """
+        Indexes everything queued so far. Failed batches are logged and
+        dropped.
+        """
+        async with self._index_lock:
+            while self._pending:
+                batch, self._pending = self._pending[:INDEX_BATCH_SIZE], self._pending[INDEX_BATCH_SIZE:]
+                try:
+                    with track_stage("molecule_index"):
+                        await self.index_messages(batch)
+                except Exception:
+                    logger.exception("Indexing molecules of %d messages failed", len(batch))
+
+    async def index_messages(self, messages: List[Dict[str, Any]]) -> List[str]:
+        """
+        Records every molecule found in the messages' text and parameters.
+        Returns the InChIKeys found.
+        """
+        found, new = await run_blocking("model", _molecules_in_messages, messages, self.matrix)
+        if not any(found):
+            return []
+        owners = await _chat_owners({message["chat_id"] for message, records in zip(messages, found) if records})
+
+        now = datetime.utcnow()
+        mentions = []
+        for message, records in zip(messages, found):
+            for record in records:
+                mentions.append(UpdateOne(
+                    {"inchikey": record.inchikey, "message_id": message["id"]},
+                    {"$setOnInsert": {
+                        "username": owners.get(message["chat_id"]),
+                        "chat_id": message["chat_id"],
+                        "role": message.get("role"),
+                        "created_at": message.get("created_at", now)
+                    }},
+                    upsert=True
+                ))
+
+        writes = [molecule_mentions_collection.bulk_write(mentions, ordered=False)]
+        if new:
+            writes.append(molecules_collection.bulk_write([
+                UpdateOne(
+                    {"_id": record.inchikey},
+                    {"$setOnInsert": {"smiles": record.smiles, "fp": Binary(record.fingerprint), "created_at": now}},
+                    upsert=True
+                )
+                for record in new.values()
+            ], ordered=False))
+        await asyncio.gather(*writes)
+
+        for record in new.values():
+            self.matrix.add(record.inchikey, record.smiles, record.fingerprint)
+        return list(dict.fromkeys(record.inchikey for records in found for record in records))
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(INDEX_INTERVAL)
+            await self.index_pending()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            register_queue("molecule_index", lambda: len(self._pending))
+
+    async def stop(self) -> None:
+        """
+        Stops the background indexer and indexes everything still queued.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.index_pending()
+
+    async def mentions(self, inchikeys: Iterable[str], username: str, limit: int = 20) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        The user's most recent mentions of each molecule, newest first.
+        """
+        async def fetch(inchikey: str):
+            cursor = molecule_mentions_collection.find(
+                {"inchikey": inchikey, "username": username},
+                {"_id": 0, "chat_id": 1, "message_id": 1, "role": 1, "created_at": 1}
+            ).sort("created_at", -1).limit(limit)
+            return inchikey, await cursor.to_list(length=limit)
+
+        results = await asyncio.gather(*(fetch(inchikey) for inchikey in inchikeys))
+        return {inchikey: found for inchikey, found in results if found}
+
+    async def lookup(self, smiles: str, username: str, limit: int = 20) -> Optional[Dict[str, Any]]:
+        """
+        Exact lookup by structure. Returns None for an invalid SMILES.
+        """
+        record = await run_blocking("model", canonicalize, smiles)
+        if record is None or not record.inchikey:
+            return None
+        found = await self.mentions([record.inchikey], username, limit)
+        return {
+            "inchikey": record.inchikey,
+            "smiles": record.smiles,
+            "mentions": found.get(record.inchikey, [])
+        }
+
+    async def similar(
+        self,
+        smiles: str,
+        username: str,
+        threshold: float = 0.7,
+        limit: int = 20,
+        mentions_per_molecule: int = 5
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Molecules this user has discussed whose Tanimoto similarity to the
+        query is at least `threshold`, most similar first. Returns None for
+        an invalid SMILES.
+        """
+        record = await run_blocking("model", describe_molecule, smiles)
+        if record is None:
+            return None
+        await self.load()
+
+        # The matrix spans all users: rank candidates by similarity and check
+        # ownership page by page until enough of them are the user's
+        results = []
+        checked = 0
+        fetch = limit * 10
+        while True:
+            with track_stage("molecule_similarity_search"):
+                hits = await run_blocking("model", self.matrix.search, record.fingerprint, threshold, fetch)
+            page = hits[checked:]
+            found = await self.mentions([inchikey for inchikey, _, _ in page], username, mentions_per_molecule)
+            for inchikey, hit_smiles, score in page:
+                if inchikey in found:
+                    results.append({
+                        "inchikey": inchikey,
+                        "smiles": hit_smiles,
+                        "similarity": round(score, 4),
+                        "mentions": found[inchikey]
+                    })
+                    if len(results) == limit:
+                        return results
+            if len(hits) < fetch:
+                return results
+            checked = len(hits)
+            fetch *= 4
+
+
+def _molecules_in_messages(
+    messages: List[Dict[str, Any]],
+    known: FingerprintMatrix
+) -> Tuple[List[List[CanonicalSmiles]], Dict[str, MoleculeRecord]]:
+    """
+    The distinct molecules of each message, plus the fingerprinted records
+    of those not yet in the index. Parsing goes through the SMILES cache;
+    runs on the model pool.
+    """
+    candidates = [
+        find_smiles_in_text(message.get("content") or "") + _smiles_in_parameters(message.get("parameters"))
+        for message in messages
+    ]
+    canonical = iter(canonicalize_batch(smiles for smiles_list in candidates for smiles in smiles_list))
+
+    found = []
+    new: Dict[str, MoleculeRecord] = {}
+    for smiles_list in candidates:
+        records: Dict[str, CanonicalSmiles] = {}
+        for record in (next(canonical) for _ in smiles_list):
+            if record is not None and record.inchikey:
+                records.setdefault(record.inchikey, record)
+        for record in records.values():
+            if record.inchikey not in known and record.inchikey not in new:
+                fingerprint = molecule_fingerprint(record.smiles)
+                if fingerprint is not None:
+                    new[record.inchikey] = MoleculeRecord(record.smiles, record.inchikey, fingerprint)
+        found.append(list(records.values()))
+    return found, new
+
+
+async def _chat_owners(chat_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+    """
+    Username of each chat, from the metadata cache or one query for the rest.
+    """
+    owners: Dict[str, Optional[str]] = {}
+    missing = []
+    for chat_id in chat_ids:
+        metadata = chat_metadata_cache.get(chat_id)
+        if metadata is not None:
+            owners[chat_id] = metadata["username"]
+        else:
+            missing.append(chat_id)
+    if missing:
+        async for chat in chats_collection.find({"chat_id": {"$in": missing}}, {"_id": 0, "chat_id": 1, "username": 1}):
+            owners[chat["chat_id"]] = chat.get("username")
+    return owners
+
+
+def _smiles_in_parameters(parameters: Optional[Dict[str, Any]]) -> List[str]:
+    if not parameters:
+        return []
+    found = []
+    for key, value in parameters.items():
+        if "smiles" not in key.lower():
+            continue
+        if isinstance(value, str):
+            found.append(value)
+        elif isinstance(value, list):
+            found.extend(item for item in value if isinstance(item, str))
+    return found
+
+
+molecule_index = MoleculeIndex()
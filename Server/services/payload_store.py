@@ -0,0 +1,142 @@
+import base64
+import hashlib
+import os
+import re
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from bson import Binary
+from pymongo import UpdateOne
+
+from models.database import blobs_collection
+
+# Text fields above this many bytes are stored zlib-compressed
+COMPRESS_THRESHOLD = int(os.getenv("MESSAGE_COMPRESS_THRESHOLD", "2048"))
+# Embedded base64 payloads above this many bytes move to the blob collection
+BLOB_THRESHOLD = int(os.getenv("MESSAGE_BLOB_THRESHOLD", "1024"))
+
+BLOB_REF_PREFIX = "blob://"
+DATA_URI_RE = re.compile(r"data:(?P<mime>[\w.+-]+/[\w.+-]+);base64,(?P<data>[A-Za-z0-9+/]+={0,2})")
+
+
+def blob_reference(digest: str) -> str:
+    return f"{BLOB_REF_PREFIX}{digest}"
+
+
+def _offload_data_uris(text: str, blobs: Dict[str, Dict[str, Any]]) -> str:
+    def replace(match: "re.Match") -> str:
+        encoded = match.group("data")
+        if len(encoded) < BLOB_THRESHOLD:
+            return match.group(0)
+        data = base64.b64decode(encoded)
+        digest = hashlib.sha256(data).hexdigest()
+        blobs[digest] = {"mime": match.group("mime"), "data": data}
+        return blob_reference(digest)
+
+    if "base64," not in text:
+        return text
+    return DATA_URI_RE.sub(replace, text)
+
+
+def _offload(value: Any, blobs: Dict[str, Dict[str, Any]]) -> Any:
+    if isinstance(value, str):
+        return _offload_data_uris(value, blobs)
+    if isinstance(value, dict):
+        return {key: _offload(item, blobs) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_offload(item, blobs) for item in value]
+    return value
+
+
+def pack_message(doc: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    """
+    Prepares a message document for storage: base64 data URIs are replaced by
+    blob:// references and large content / parameters are zlib-compressed
+    into content_z / parameters_z. Returns the document and the blobs it
+    references, keyed by SHA-256.
+    """
+    blobs: Dict[str, Dict[str, Any]] = {}
+    packed = dict(doc)
+
+    content = _offload(packed.get("content") or "", blobs)
+    encoded = content.encode("utf-8")
+    if len(encoded) > COMPRESS_THRESHOLD:
+        del packed["content"]
+        packed["content_z"] = Binary(zlib.compress(encoded, 6))
+    else:
+        packed["content"] = content
+
+    parameters = packed.get("parameters")
+    if parameters:
+        parameters = _offload(parameters, blobs)
+        encoded = orjson.dumps(parameters, option=orjson.OPT_NON_STR_KEYS)
+        if len(encoded) > COMPRESS_THRESHOLD:
+            del packed["parameters"]
+            packed["parameters_z"] = Binary(zlib.compress(encoded, 6))
+        else:
+            packed["parameters"] = parameters
+
+    return packed, blobs
+
+
+def unpack_message(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Inverse of pack_message for the compressed fields. blob:// references are
+    left in place; clients fetch them from /blobs/{digest} when needed.
+    """
+    content_z = doc.pop("content_z", None)
+    if content_z is not None:
+        doc["content"] = zlib.decompress(content_z).decode("utf-8")
+    parameters_z = doc.pop("parameters_z", None)
+    if parameters_z is not None:
+        doc["parameters"] = orjson.loads(zlib.decompress(parameters_z))
+    return doc
+
+
+async def save_blobs(blobs: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Stores blobs by content hash in one round trip. Existing blobs are left
+    untouched, so the same image referenced by many messages is kept once.
+    """
+    if not blobs:
+        return
+    now = datetime.utcnow()
+    await blobs_collection.bulk_write([
+        UpdateOne(
+            {"_id": digest},
+            {"$setOnInsert": {
+                "mime": blob["mime"],
+                "size": len(blob["data"]),
+                "data": Binary(blob["data"]),
+                "created_at": now
+            }},
+            upsert=True
+        )
+        for digest, blob in blobs.items()
+    ], ordered=False)
+
+
+async def pack_messages(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Packs a batch of message documents and stores the blobs they reference.
+    """
+    packed_docs = []
+    all_blobs: Dict[str, Dict[str, Any]] = {}
+    for doc in docs:
+        packed, blobs = pack_message(doc)
+        packed_docs.append(packed)
+        all_blobs.update(blobs)
+    await save_blobs(all_blobs)
+    return packed_docs
+
+
+async def get_blob(digest: str) -> Optional[Tuple[bytes, str]]:
+    """
+    Returns (data, mime type) of a stored blob, or None.
+    """
+    blob = await blobs_collection.find_one({"_id": digest}, {"data": 1, "mime": 1})
+    if blob is None:
+        return None
+    return bytes(blob["data"]), blob["mime"]
@@ -0,0 +1,154 @@
+import heapq
+import os
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from services.executors import run_blocking
+from services.inference_cache import normalize_protein_sequence, screen_cache
+from services.ml_service import generate_binding_affinity_explanation, score_binding_affinities
+from utils.chem_utils import canonicalize_batch, parse_smiles_lines
+from utils.fast_json import dumps
+from utils.metrics import track_stage
+
+SCREEN_MAX_MOLECULES = int(os.getenv("SCREEN_MAX_MOLECULES", "50000"))
+# Request bodies and uploaded files are refused beyond this size, before
+# they are parsed
+SCREEN_MAX_UPLOAD_BYTES = int(os.getenv("SCREEN_MAX_UPLOAD_BYTES", str(16 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 64 * 1024
+# Molecules per model call; bounds the memory of one Plapt forward pass
+SCREEN_BATCH_SIZE = int(os.getenv("SCREEN_BATCH_SIZE", "256"))
+# Worker processes for canonicalizing large uploads (0 = in the model pool thread)
+SCREEN_CANONICALIZE_PROCESSES = int(os.getenv("SCREEN_CANONICALIZE_PROCESSES", "0"))
+# Molecules passed to the LLM when an explanation is requested
+SCREEN_EXPLAIN_TOP = 10
+# Lines per chunk of the streamed response
+STREAM_LINES_PER_CHUNK = 500
+
+PROTEIN_RE = re.compile(r"^[A-Z]+$")
+
+
+class ScreeningError(ValueError):
+    """
+    Invalid screening input; carries the HTTP status to answer with.
+    """
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+async def read_limited(chunks: AsyncIterator[bytes], limit: int = SCREEN_MAX_UPLOAD_BYTES) -> bytes:
+    """
+    Joins the chunks of a body or upload, raising ScreeningError (413) as
+    soon as they add up to more than `limit` bytes.
+    """
+    data = bytearray()
+    async for chunk in chunks:
+        data += chunk
+        if len(data) > limit:
+            raise ScreeningError(f"At most {limit} bytes per request.", status_code=413)
+    return bytes(data)
+
+
+def parse_smiles_file(data: bytes) -> List[str]:
+    """
+    One molecule per line, SMILES first (.smi / single-column CSV). Blank
+    lines, comments and a "smiles" header are skipped.
+    """
+    return list(parse_smiles_lines(data.decode("utf-8", errors="replace").splitlines()))
+
+
+def validate_target(protein_sequence: str) -> str:
+    protein = normalize_protein_sequence(protein_sequence or "")
+    if not protein:
+        raise ScreeningError("protein_sequence is required.")
+    if not PROTEIN_RE.match(protein):
+        raise ScreeningError("protein_sequence must be a one-letter amino acid sequence.")
+    return protein
+
+
+async def screen(
+    protein_sequence: str,
+    smiles_list: List[str],
+    top_k: Optional[int] = None,
+    explain: bool = False
+) -> Dict[str, Any]:
+    """
+    Scores every valid molecule against the target and ranks them by pKd,
+    strongest first. Returns {"target", "scored", "ranked", "invalid",
+    "explanation"}; with top_k, "ranked" only holds the best top_k.
+    Raises ScreeningError for unusable input.
+    """
+    protein = validate_target(protein_sequence)
+    if not smiles_list:
+        raise ScreeningError("No SMILES provided.")
+    if len(smiles_list) > SCREEN_MAX_MOLECULES:
+        raise ScreeningError(f"At most {SCREEN_MAX_MOLECULES} molecules per request.", status_code=413)
+
+    with track_stage("screen_canonicalize"):
+        records = await run_blocking("model", canonicalize_batch, smiles_list, SCREEN_CANONICALIZE_PROCESSES)
+
+    valid = [(raw, record) for raw, record in zip(smiles_list, records) if record is not None]
+    invalid = [raw for raw, record in zip(smiles_list, records) if record is None]
+    if not valid:
+        raise ScreeningError("No valid SMILES provided.")
+
+    with track_stage("screen_score"):
+        scores = await score_binding_affinities(
+            protein, [record.smiles for _, record in valid], SCREEN_BATCH_SIZE, cache=screen_cache
+        )
+    if scores is None:
+        raise ScreeningError("The model produced no predictions.", status_code=503)
+
+    rows = [
+        {
+            "input": raw,
+            "smiles": record.smiles,
+            "inchikey": record.inchikey,
+            "neg_log10_affinity_M": score["neg_log10_affinity_M"],
+            "affinity_uM": score["affinity_uM"]
+        }
+        for (raw, record), score in zip(valid, scores)
+    ]
+    if top_k is not None:
+        ranked = heapq.nlargest(top_k, rows, key=lambda row: row["neg_log10_affinity_M"])
+    else:
+        ranked = sorted(rows, key=lambda row: row["neg_log10_affinity_M"], reverse=True)
+
+    explanation = None
+    if explain:
+        top = [
+            {"molecule": row["smiles"], "neg_log10_affinity_M": row["neg_log10_affinity_M"], "affinity_uM": row["affinity_uM"]}
+            for row in ranked[:SCREEN_EXPLAIN_TOP]
+        ]
+        explanation = await run_blocking("llm", generate_binding_affinity_explanation, protein, top)
+
+    return {"target": protein, "scored": len(rows), "ranked": ranked, "invalid": invalid, "explanation": explanation}
+
+
+async def stream_screen_results(result: Dict[str, Any]) -> AsyncIterator[bytes]:
+    """
+    NDJSON: a summary line, one line per ranked molecule, one per invalid
+    input, then the explanation if one was requested.
+    """
+    ranked = result["ranked"]
+    yield dumps({
+        "type": "summary",
+        "target_length": len(result["target"]),
+        "scored": result["scored"],
+        "returned": len(ranked),
+        "invalid": len(result["invalid"])
+    }) + b"\n"
+
+    chunk = []
+    for rank, row in enumerate(ranked, start=1):
+        chunk.append(dumps({"type": "result", "rank": rank, **row}))
+        if len(chunk) == STREAM_LINES_PER_CHUNK:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+    for raw in result["invalid"]:
+        chunk.append(dumps({"type": "invalid", "input": raw}))
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+    if result["explanation"] is not None:
+        yield dumps({"type": "explanation", "text": result["explanation"]}) + b"\n"
@@ -0,0 +1,145 @@
+import logging
+import os
+import zlib
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Optional
+
+from bson import Binary
+from pymongo import ReturnDocument
+
+from models.database import sessions_collection
+from services.chat_session import ChatSession
+from services.session_store import SessionStore, create_session_store
+from utils.metrics import record_cache_lookup, track_stage
+
+logger = logging.getLogger(__name__)
+
+# Serialized sessions above this many bytes are stored zlib-compressed
+SESSION_COMPRESS_THRESHOLD = int(os.getenv("SESSION_COMPRESS_THRESHOLD", "2048"))
+
+
+class SessionBackend(ABC):
+    """
+    Where ChatSessions live between requests. Callers load a session, let the
+    turn mutate it, then save it back.
+    """
+    @abstractmethod
+    async def load(self, session_id: str) -> Optional[ChatSession]:
+        ...
+
+    @abstractmethod
+    async def save(self, session_id: str, session: ChatSession) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, session_id: str) -> None:
+        ...
+
+    def expire(self) -> int:
+        """
+        Drops idle sessions held in this process. Returns how many were dropped.
+        """
+        return 0
+
+
+class InMemorySessionBackend(SessionBackend):
+    """
+    Sessions held in this process only. Fine for a single worker; with
+    several, each worker sees a different history for the same chat.
+    """
+    def __init__(self, store: SessionStore):
+        self.store = store
+
+    async def load(self, session_id: str) -> Optional[ChatSession]:
+        return self.store.get(session_id)
+
+    async def save(self, session_id: str, session: ChatSession) -> None:
+        self.store.put(session_id, session)
+
+    async def delete(self, session_id: str) -> None:
+        self.store.pop(session_id)
+
+    def expire(self) -> int:
+        return self.store.expire()
+
+
+class MongoSessionBackend(SessionBackend):
+    """
+    Sessions shared by every worker through the sessions collection, one
+    document per session: {_id, v, data, z, updated_at}. `v` is bumped on
+    every save.
+
+    Each process keeps a near-cache of the sessions it has seen. A load sends
+    the cached version along and only gets the document back when another
+    worker has saved a newer one, so a chat that stays on one worker costs a
+    single _id lookup with no payload.
+    """
+    def __init__(self, collection, near_cache: SessionStore):
+        self.collection = collection
+        self.near_cache = near_cache
+
+    async def load(self, session_id: str) -> Optional[ChatSession]:
+        cached = self.near_cache.get(session_id)
+        query = {"_id": session_id}
+        if cached is not None:
+            query["v"] = {"$ne": cached.version}
+
+        with track_stage("session_load"):
+            doc = await self.collection.find_one(query)
+
+        if doc is None:
+            record_cache_lookup("session_near_cache", cached is not None)
+            return cached
+        record_cache_lookup("session_near_cache", False)
+
+        data = bytes(doc["data"])
+        if doc.get("z"):
+            data = zlib.decompress(data)
+        session = ChatSession.from_bytes(data)
+        session.version = doc["v"]
+        self.near_cache.put(session_id, session)
+        return session
+
+    async def save(self, session_id: str, session: ChatSession) -> None:
+        data = session.to_bytes()
+        compressed = len(data) > SESSION_COMPRESS_THRESHOLD
+        if compressed:
+            data = zlib.compress(data, 6)
+
+        # Last write wins: two workers handling turns of the same chat at the
+        # same moment is not a case the client produces.
+        with track_stage("session_save"):
+            doc = await self.collection.find_one_and_update(
+                {"_id": session_id},
+                {
+                    "$set": {"data": Binary(data), "z": compressed, "updated_at": datetime.utcnow()},
+                    "$inc": {"v": 1}
+                },
+                projection={"v": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        session.version = doc["v"]
+        self.near_cache.put(session_id, session)
+
+    async def delete(self, session_id: str) -> None:
+        self.near_cache.pop(session_id)
+        await self.collection.delete_one({"_id": session_id})
+
+    def expire(self) -> int:
+        # The collection itself is expired by its TTL index
+        return self.near_cache.expire()
+
+
+def create_session_backend() -> SessionBackend:
+    """
+    Picks the backend from SESSION_BACKEND: "memory" (default) or "mongo".
+    Multi-worker deployments need "mongo".
+    """
+    backend = os.getenv("SESSION_BACKEND", "memory").lower()
+    if backend == "memory":
+        return InMemorySessionBackend(create_session_store())
+    if backend == "mongo":
+        return MongoSessionBackend(sessions_collection, create_session_store())
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
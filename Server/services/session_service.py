@@ -1,19 +1,40 @@
 import uuid
-from typing import Dict, Tuple, Any
+from typing import Tuple
 from fastapi import Request
 
+from services.chat_service import get_recent_history
 from services.chat_session import ChatSession
+from services.session_backend import create_session_backend
+from utils.metrics import track_stage
 
-sessions: Dict[str, Any] = {}
+session_backend = create_session_backend()
 
-def get_session(request: Request) -> Tuple[ChatSession, str]:
+async def load_chat_session(chat_id: str) -> ChatSession:
+    """
+    Returns the chat's session. A session that was evicted or lost in a
+    restart is rebuilt from the last messages stored for the chat, so
+    sessions can be dropped freely without the conversation losing context.
+    """
+    session = await session_backend.load(chat_id)
+    if session is not None:
+        return session
+    
+    session = ChatSession()
+    with track_stage("session_rehydrate"):
+        for message in await get_recent_history(chat_id):
+            session.add_message(message)
+    return session
+
+async def get_session(request: Request) -> Tuple[ChatSession, str]:
     """
     Get or create a session for the current request.
     """
     session_id = request.cookies.get("session_id")
     
-    if not session_id or session_id not in sessions:
+    session = await session_backend.load(session_id) if session_id else None
+    if session is None:
         session_id = str(uuid.uuid4())
-        sessions[session_id] = ChatSession()
+        session = ChatSession()
+        await session_backend.save(session_id, session)
     
-    return sessions[session_id], session_id
\ No newline at end of file
+    return session, session_id
@@ -0,0 +1,134 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Tuple
+
+from services.chat_session import ChatSession
+from utils.metrics import SESSION_EVICTIONS, SESSIONS_ACTIVE, SESSIONS_BYTES
+
+
+class SessionStore:
+    """
+    In-memory ChatSession store ordered by last access.
+
+    Every read or write moves the session to the back of an OrderedDict, so
+    the front always holds the least recently used one. Expiry and eviction
+    only ever pop from the front: O(1) per evicted session, and a sweep stops
+    at the first session that is still fresh.
+    """
+    def __init__(self, max_sessions: int = 10000, idle_timeout: float = 3600.0, max_bytes: int = 256 * 1024 * 1024):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_bytes = max_bytes
+
+        # session_id -> (last_access, approximate size, session)
+        self._entries: "OrderedDict[str, Tuple[float, int, ChatSession]]" = OrderedDict()
+        self.total_bytes = 0
+        self.evictions: Dict[str, int] = {"idle": 0, "capacity": 0, "memory": 0}
+
+        SESSIONS_ACTIVE.set_function(lambda: len(self._entries))
+        SESSIONS_BYTES.set_function(lambda: self.total_bytes)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._entries))
+
+    def __getitem__(self, session_id: str) -> ChatSession:
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    def __setitem__(self, session_id: str, session: ChatSession) -> None:
+        self.put(session_id, session)
+
+    def __delitem__(self, session_id: str) -> None:
+        if self.pop(session_id) is None:
+            raise KeyError(session_id)
+
+    def get(self, session_id: str, default: Optional[ChatSession] = None) -> Optional[ChatSession]:
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return default
+        _, size, session = entry
+        self._entries[session_id] = (now, size, session)
+        self._entries.move_to_end(session_id)
+        return session
+
+    def put(self, session_id: str, session: ChatSession) -> None:
+        """
+        Stores (or re-measures, after a turn grew it) a session and enforces
+        the count and memory limits.
+        """
+        now = time.monotonic()
+        previous = self._entries.pop(session_id, None)
+        if previous is not None:
+            self.total_bytes -= previous[1]
+        size = session.approx_size()
+        self._entries[session_id] = (now, size, session)
+        self.total_bytes += size
+        self._expire(now)
+        self._enforce_limits(keep=session_id)
+
+    def pop(self, session_id: str) -> Optional[ChatSession]:
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return None
+        self.total_bytes -= entry[1]
+        return entry[2]
+
+    def _evict_oldest(self, reason: str) -> None:
+        _, (_, size, _) = self._entries.popitem(last=False)
+        self.total_bytes -= size
+        self.evictions[reason] += 1
+        SESSION_EVICTIONS.labels(reason).inc()
+
+    def _expire(self, now: float) -> int:
+        expired = 0
+        cutoff = now - self.idle_timeout
+        while self._entries:
+            last_access = next(iter(self._entries.values()))[0]
+            if last_access > cutoff:
+                break
+            self._evict_oldest("idle")
+            expired += 1
+        return expired
+
+    def _enforce_limits(self, keep: str) -> None:
+        while len(self._entries) > self.max_sessions:
+            self._evict_oldest("capacity")
+        # Never evict the session that is being written, even if it alone is
+        # over budget
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1 and next(iter(self._entries)) != keep:
+            self._evict_oldest("memory")
+
+    def expire(self) -> int:
+        """
+        Drops every session idle for longer than idle_timeout. Returns how
+        many were dropped.
+        """
+        return self._expire(time.monotonic())
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "sessions": len(self._entries),
+            "approx_bytes": self.total_bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "evictions": dict(self.evictions)
+        }
+
+
+def create_session_store() -> SessionStore:
+    return SessionStore(
+        max_sessions=int(os.getenv("SESSION_MAX_COUNT", "10000")),
+        idle_timeout=float(os.getenv("SESSION_IDLE_TIMEOUT", "3600")),
+        max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(256 * 1024 * 1024)))
+    )
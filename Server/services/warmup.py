@@ -0,0 +1,88 @@
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from services.executors import run_blocking
+from services.ml_service import get_admet_scraper, get_plapt
+from utils.chem_utils import canonicalize_batch
+
+logger = logging.getLogger(__name__)
+
+# Subsystems to load in the background at startup, e.g. "plapt,admet".
+# /readyz only reports ready once all of them are warm.
+WARMUP_MODELS = [name.strip() for name in os.getenv("WARMUP_MODELS", "").split(",") if name.strip()]
+
+# A short real target, so warm-up exercises the full scoring path
+DUMMY_PROTEIN = "MKTVRQERLKSIVRILERSKEPVSGAQLAEELSVSRQVIVQDIAYLRSLGYNIVATPRGYVLAGG"
+DUMMY_SMILES = "CC(=O)Oc1ccccc1C(=O)O"
+
+
+def warm_plapt() -> None:
+    get_plapt().score_candidates(DUMMY_PROTEIN, [DUMMY_SMILES])
+
+
+def warm_admet() -> None:
+    # Imports selenium and the scraper; starting a browser against SwissADME
+    # at every deploy would be rude to the service
+    get_admet_scraper()
+
+
+def warm_chemistry() -> None:
+    canonicalize_batch([DUMMY_SMILES])
+
+
+WARMERS: Dict[str, Callable[[], None]] = {
+    "plapt": warm_plapt,
+    "admet": warm_admet,
+    "chemistry": warm_chemistry,
+}
+
+
+class Readiness:
+    """
+    Warm-up state of each subsystem: cold, warming, ready or failed.
+    """
+    def __init__(self, required: List[str]):
+        self.required = required
+        self._status: Dict[str, Dict[str, Any]] = {name: {"state": "cold"} for name in WARMERS}
+
+    def set(self, name: str, state: str, seconds: Optional[float] = None, error: Optional[str] = None) -> None:
+        status: Dict[str, Any] = {"state": state}
+        if seconds is not None:
+            status["seconds"] = round(seconds, 2)
+        if error is not None:
+            status["error"] = error
+        self._status[name] = status
+
+    def is_ready(self) -> bool:
+        return all(self._status.get(name, {}).get("state") == "ready" for name in self.required)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: dict(status) for name, status in self._status.items()}
+
+
+readiness = Readiness(WARMUP_MODELS)
+
+
+async def warm_up(names: List[str] = WARMUP_MODELS) -> None:
+    """
+    Loads each subsystem on the model pool, one after the other so warm-up
+    never competes with itself for memory.
+    """
+    for name in names:
+        warmer = WARMERS.get(name)
+        if warmer is None:
+            logger.warning("Unknown warm-up target %s", name)
+            readiness.set(name, "failed", error="unknown subsystem")
+            continue
+        readiness.set(name, "warming")
+        start = time.perf_counter()
+        try:
+            await run_blocking("model", warmer)
+        except Exception as e:
+            logger.exception("Warm-up of %s failed", name)
+            readiness.set(name, "failed", seconds=time.perf_counter() - start, error=str(e))
+        else:
+            readiness.set(name, "ready", seconds=time.perf_counter() - start)
+            logger.info("Warmed up %s in %.2fs", name, time.perf_counter() - start)
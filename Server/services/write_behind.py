@@ -0,0 +1,155 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from utils.metrics import register_queue, track_stage
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class WriteBehindFull(Exception):
+    """
+    Raised by add_turn when the buffer is still full after a flush, i.e.
+    Mongo has been failing for a while. Answered with 503.
+    """
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class WriteBehindBuffer:
+    """
+    Buffers chat turns in memory and persists them in batches: one unordered
+    insert_many for all pending messages and one bulk_write with a single
+    metadata update per chat.
+
+    At most `flush_interval` seconds of turns can be lost if the process dies
+    without running stop(). Writers wait for a flush once `max_pending`
+    messages are buffered, and are refused with WriteBehindFull while the
+    buffer cannot be drained, so memory stays bounded during a Mongo outage.
+
+    Messages and chat updates are retried independently. insert_many gives
+    every document its _id before sending it, so a retried batch that was
+    partly written only gets duplicate key errors for the written part,
+    which count as done.
+    """
+    def __init__(self, messages_collection, chats_collection, flush_interval: float = 1.0, max_pending: int = 1000):
+        self.messages_collection = messages_collection
+        self.chats_collection = chats_collection
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._messages: List[Dict[str, Any]] = []
+        self._chat_updates: Dict[str, Dict[str, Any]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._messages)
+
+    def has_pending(self, chat_id: str) -> bool:
+        return chat_id in self._chat_updates
+
+    async def add_turn(self, messages: List[Dict[str, Any]], chat_id: str, chat_update: Dict[str, Any]) -> None:
+        if len(self._messages) >= self.max_pending:
+            raise WriteBehindFull("Chat history cannot be saved right now, please retry shortly.", self.flush_interval)
+        self._messages.extend(messages)
+        # Only the newest metadata per chat matters
+        self._chat_updates[chat_id] = chat_update
+        if len(self._messages) >= self.max_pending:
+            try:
+                await self.flush()
+            except Exception:
+                pass  # already logged; the turn stays buffered and later ones are refused
+
+    async def _insert_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Returns the messages that still have to be written.
+        """
+        try:
+            await self.messages_collection.insert_many(messages, ordered=False)
+        except BulkWriteError as e:
+            rejected = [
+                error for error in e.details.get("writeErrors", [])
+                if error.get("code") != DUPLICATE_KEY
+            ]
+            # Mongo refused these documents themselves; another attempt
+            # would be refused the same way
+            for error in rejected:
+                logger.error("Write-behind dropped message %s: %s", messages[error["index"]].get("id"), error.get("errmsg"))
+            return []
+        except Exception:
+            logger.exception("Write-behind insert of %d messages failed, will retry", len(messages))
+            return messages
+        return []
+
+    async def _update_chats(self, chat_updates: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the chat updates that still have to be applied.
+        """
+        try:
+            await self.chats_collection.bulk_write(
+                [UpdateOne({"chat_id": chat_id}, {"$set": update}) for chat_id, update in chat_updates.items()],
+                ordered=False
+            )
+        except Exception:
+            logger.exception("Write-behind update of %d chats failed, will retry", len(chat_updates))
+            return chat_updates
+        return {}
+
+    async def flush(self) -> None:
+        """
+        Writes out everything buffered. Whatever could not be written is put
+        back for the next flush, and the call raises RuntimeError.
+        """
+        async with self._flush_lock:
+            if not self._messages and not self._chat_updates:
+                return
+            messages, self._messages = self._messages, []
+            chat_updates, self._chat_updates = self._chat_updates, {}
+
+            with track_stage("write_behind_flush"):
+                unwritten = await self._insert_messages(messages) if messages else []
+                unapplied = await self._update_chats(chat_updates) if chat_updates else {}
+
+            # In front of anything buffered meanwhile, to keep the order; a
+            # newer update of the same chat wins
+            self._messages[:0] = unwritten
+            for chat_id, update in unapplied.items():
+                self._chat_updates.setdefault(chat_id, update)
+            if unwritten or unapplied:
+                raise RuntimeError(
+                    f"Write-behind flush left {len(unwritten)} messages and {len(unapplied)} chat updates pending"
+                )
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                pass  # already logged, batch kept for the next round
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            register_queue("write_behind", lambda: self.pending)
+
+    async def stop(self) -> None:
+        """
+        Stops the periodic flusher and writes out everything still buffered.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
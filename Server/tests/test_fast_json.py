@@ -0,0 +1,60 @@
+"""
+Validation of message documents on the orjson response paths. Run from the
+Server directory: python -m pytest tests
+"""
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Dict, List
+
+import pytest
+from pydantic import ValidationError
+
+from utils.fast_json import encode_messages, stream_messages, stream_messages_ndjson, validate_message_stream
+
+
+def message(n: int, **fields: Any) -> Dict[str, Any]:
+    doc = {"id": f"m{n}", "chat_id": "c", "role": "user", "content": f"q{n}", "created_at": datetime(2025, 1, 1, 0, 0, n)}
+    doc.update(fields)
+    return doc
+
+
+async def cursor(docs: List[Dict[str, Any]]):
+    for doc in docs:
+        yield doc
+
+
+async def collect(chunks) -> bytes:
+    return b"".join([chunk async for chunk in chunks])
+
+
+def test_every_page_document_is_validated():
+    with pytest.raises(ValidationError):
+        encode_messages([message(0), message(1, content=None)])
+    body = json.loads(encode_messages([message(0), message(1)], {"next_cursor": None}))
+    assert [doc["id"] for doc in body["messages"]] == ["m0", "m1"]
+    assert body["messages"][0]["ml_activated"] is False
+
+
+def test_bad_first_document_fails_before_streaming():
+    async def scenario():
+        with pytest.raises(ValidationError):
+            await validate_message_stream(cursor([message(0, role=None), message(1)]))
+        documents = await validate_message_stream(cursor([]))
+        assert json.loads(await collect(stream_messages(documents))) == {"messages": []}
+
+    asyncio.run(scenario())
+
+
+def test_bad_later_document_truncates_the_stream():
+    async def scenario():
+        documents = await validate_message_stream(cursor([message(0), message(1, content=None), message(2)]))
+        chunks = stream_messages_ndjson(documents)
+        assert json.loads(await anext(chunks))["id"] == "m0"
+        with pytest.raises(ValidationError):
+            await anext(chunks)
+
+        documents = await validate_message_stream(cursor([message(0), message(1)]))
+        assert [doc["id"] for doc in json.loads(await collect(stream_messages(documents)))["messages"]] == ["m0", "m1"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,119 @@
+"""
+Partial failures of WriteBehindBuffer flushes, against in-memory fakes of
+the two collections. Run from the Server directory: python -m pytest tests
+"""
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from services.write_behind import WriteBehindBuffer, WriteBehindFull
+
+
+class FakeMessages:
+    """
+    Unordered insert_many with pymongo's semantics: documents get their _id
+    before being sent, and a duplicate _id is a per-document error 11000.
+    fail_after makes the next call write that many documents and then lose
+    the connection.
+    """
+    def __init__(self):
+        self.documents: Dict[Any, Dict[str, Any]] = {}
+        self.fail_after = None
+
+    async def insert_many(self, documents: List[Dict[str, Any]], ordered: bool = True):
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+        errors = []
+        for index, document in enumerate(documents):
+            if self.fail_after is not None and index == self.fail_after:
+                self.fail_after = None
+                raise AutoReconnect("connection reset")
+            if document["_id"] in self.documents:
+                errors.append({"index": index, "code": 11000, "errmsg": "E11000 duplicate key error"})
+            else:
+                self.documents[document["_id"]] = dict(document)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(documents) - len(errors)})
+
+
+class FakeChats:
+    def __init__(self):
+        self.updates: List[Any] = []
+        self.failures = 0
+
+    async def bulk_write(self, requests: List[Any], ordered: bool = True):
+        if self.failures:
+            self.failures -= 1
+            raise AutoReconnect("connection reset")
+        self.updates.extend(requests)
+
+
+def turn(chat_id: str, n: int) -> List[Dict[str, Any]]:
+    return [{"id": f"{chat_id}-{n}-{role}", "chat_id": chat_id, "role": role} for role in ("user", "assistant")]
+
+
+def test_messages_written_when_only_chat_update_fails():
+    async def scenario():
+        messages, chats = FakeMessages(), FakeChats()
+        buffer = WriteBehindBuffer(messages, chats, max_pending=100)
+        await buffer.add_turn(turn("a", 0), "a", {"last_message_preview": "0"})
+
+        chats.failures = 1
+        with pytest.raises(RuntimeError):
+            await buffer.flush()
+        assert len(messages.documents) == 2
+        assert buffer.pending == 0
+        assert buffer.has_pending("a")
+
+        await buffer.flush()
+        assert not buffer.has_pending("a")
+        assert len(chats.updates) == 1
+
+    asyncio.run(scenario())
+
+
+def test_partly_written_batch_is_not_written_twice():
+    async def scenario():
+        messages, chats = FakeMessages(), FakeChats()
+        buffer = WriteBehindBuffer(messages, chats, max_pending=100)
+        for n in range(3):
+            await buffer.add_turn(turn("a", n), "a", {"last_message_preview": str(n)})
+
+        messages.fail_after = 4
+        with pytest.raises(RuntimeError):
+            await buffer.flush()
+        assert len(messages.documents) == 4
+        assert buffer.pending == 6
+
+        # The retry only hits duplicates for what the first attempt wrote
+        await buffer.flush()
+        assert buffer.pending == 0
+        assert sorted(doc["id"] for doc in messages.documents.values()) == sorted(
+            doc["id"] for n in range(3) for doc in turn("a", n)
+        )
+
+    asyncio.run(scenario())
+
+
+def test_full_buffer_refuses_turns_during_outage():
+    async def scenario():
+        messages, chats = FakeMessages(), FakeChats()
+        buffer = WriteBehindBuffer(messages, chats, max_pending=4)
+        await buffer.add_turn(turn("a", 0), "a", {})
+
+        # Reaching the limit flushes; the failed flush keeps the turn
+        messages.fail_after = 0
+        await buffer.add_turn(turn("a", 1), "a", {})
+        assert buffer.pending == 4
+        with pytest.raises(WriteBehindFull):
+            await buffer.add_turn(turn("a", 2), "a", {})
+        assert buffer.pending == 4
+
+        await buffer.flush()
+        await buffer.add_turn(turn("a", 2), "a", {})
+        assert buffer.pending == 2
+
+    asyncio.run(scenario())
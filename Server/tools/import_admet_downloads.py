@@ -0,0 +1,55 @@
+"""
+Moves the SwissADME files earlier versions left in downloads/
+(swissadme_<id>.csv, one per request) into the ADMET artifact store, keyed
+by the InChIKey of their "Canonical SMILES" column, so they are reused
+instead of scraped again. Duplicates collapse to one stored object.
+
+Run from the Server directory (ADMET_ARTIFACT_DIR selects the store):
+
+    python -m tools.import_admet_downloads downloads --delete
+"""
+import argparse
+import csv
+import glob
+import io
+import json
+import os
+
+from services.artifact_store import get_admet_artifacts
+from services.ml_service import admet_artifact_key
+
+
+def molecule_smiles(data: bytes):
+    rows = csv.DictReader(io.StringIO(data.decode("utf-8", errors="replace")))
+    row = next(rows, None)
+    if row is None:
+        return None
+    return row.get("Canonical SMILES") or row.get("SMILES")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import old SwissADME downloads into the artifact store.")
+    parser.add_argument("directory", nargs="?", default="downloads")
+    parser.add_argument("--delete", action="store_true", help="remove each file once it is stored")
+    args = parser.parse_args()
+
+    csv.field_size_limit(1 << 30)  # the embedded base64 image is a single field
+    store = get_admet_artifacts()
+    imported, skipped, digests = 0, 0, set()
+    for path in sorted(glob.glob(os.path.join(args.directory, "swissadme*.csv"))):
+        with open(path, "rb") as handle:
+            data = handle.read()
+        smiles = molecule_smiles(data)
+        if not smiles:
+            skipped += 1
+            continue
+        digests.add(store.put(admet_artifact_key(smiles), data))
+        imported += 1
+        if args.delete:
+            os.remove(path)
+
+    print(json.dumps({"imported": imported, "skipped": skipped, "distinct": len(digests), "store": store.stats()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Runs explain() on every query shape the services issue and fails if any
+winning plan contains a COLLSCAN.
+
+Run from the Server directory against the target database:
+
+    python -m tools.verify_query_plans [--ensure-indexes]
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from models.database import (
+    chats_collection,
+    messages_collection,
+    molecule_mentions_collection,
+    sessions_collection
+)
+from models.indexes import ensure_indexes
+from services.chat_service import (
+    CHAT_LIST_ORDER,
+    MESSAGE_ORDER,
+    MESSAGE_ORDER_DESC,
+    chat_list_keyset_filter,
+    encode_chat_cursor,
+    encode_message_cursor,
+    message_keyset_filter
+)
+
+
+def query_shapes(chat_id: str, username: str) -> List[Tuple[str, Any, Dict[str, Any], Optional[List[Tuple[str, int]]]]]:
+    """
+    (name, collection, filter, sort) for each query in services/chat_service.py,
+    services/session_backend.py and main.py. Keep in sync with the services.
+    """
+    cursor = encode_message_cursor(datetime.utcnow(), "ffffffff-ffff-ffff-ffff-ffffffffffff")
+    chat_cursor = encode_chat_cursor(datetime.utcnow(), "ffffffff-ffff-ffff-ffff-ffffffffffff")
+    empty_chat_cursor = encode_chat_cursor(None, "ffffffff-ffff-ffff-ffff-ffffffffffff")
+    return [
+        ("get_chat_metadata", chats_collection, {"chat_id": chat_id}, None),
+        ("store_turn.update_chat", chats_collection, {"chat_id": chat_id}, None),
+        ("get_user_chats_page.first", chats_collection, {"username": username}, CHAT_LIST_ORDER),
+        ("get_user_chats_page", chats_collection, chat_list_keyset_filter(username, chat_cursor), CHAT_LIST_ORDER),
+        ("get_user_chats_page.no_messages", chats_collection, chat_list_keyset_filter(username, empty_chat_cursor), CHAT_LIST_ORDER),
+        ("get_user_chats_page.total", chats_collection, {"username": username}, None),
+        ("molecule_index.mentions", molecule_mentions_collection,
+         {"inchikey": "XLYOFNOQVPJJNP-UHFFFAOYSA-N", "username": username}, [("created_at", -1)]),
+        ("get_chat_messages", messages_collection, {"chat_id": chat_id}, MESSAGE_ORDER),
+        ("get_recent_history", messages_collection, {"chat_id": chat_id}, MESSAGE_ORDER_DESC),
+        ("get_chat_message_documents_page.after", messages_collection, message_keyset_filter(chat_id, cursor, "$gt"), MESSAGE_ORDER),
+        ("get_chat_message_documents_page.before", messages_collection, message_keyset_filter(chat_id, cursor, "$lt"), MESSAGE_ORDER_DESC),
+        ("session_backend.load", sessions_collection, {"_id": chat_id, "v": {"$ne": 1}}, None),
+    ]
+
+
+def plan_stages(plan: Any) -> Iterator[str]:
+    """
+    Yields every stage name in an explain plan tree, covering both the classic
+    (inputStage/inputStages) and slot-based engine (queryPlan) layouts.
+    """
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for key, value in plan.items():
+            if key in ("inputStage", "inputStages", "queryPlan", "winningPlan", "shards", "outerStage", "innerStage"):
+                yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from plan_stages(item)
+
+
+async def sample_ids() -> Tuple[str, str]:
+    chat = await chats_collection.find_one({}, {"chat_id": 1, "username": 1})
+    if chat:
+        return chat["chat_id"], chat["username"]
+    return "00000000-0000-0000-0000-000000000000", "nobody@example.com"
+
+
+async def verify(ensure: bool) -> int:
+    if ensure:
+        await ensure_indexes()
+
+    chat_id, username = await sample_ids()
+    failures = 0
+    for name, collection, query, sort in query_shapes(chat_id, username):
+        cursor = collection.find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        stages = list(plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {})))
+        ok = "COLLSCAN" not in stages
+        failures += not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {name}: {' <- '.join(stages)}")
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify that every service query uses an index.")
+    parser.add_argument("--ensure-indexes", action="store_true", help="Create the declared indexes before checking")
+    args = parser.parse_args()
+
+    failures = asyncio.run(verify(args.ensure_indexes))
+    if failures:
+        print(f"{failures} quer{'y' if failures == 1 else 'ies'} fell back to a collection scan")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,189 @@
-from rdkit import Chem
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
-def validate_smiles(smiles: str) -> bool:
+import numpy as np
+from rdkit import Chem, DataStructs, RDLogger
+from rdkit.Chem import rdFingerprintGenerator
+
+from utils.metrics import record_cache_lookup
+
+# Candidate tokens are parsed on every stored message; keep RDKit quiet
+RDLogger.DisableLog("rdApp.*")
+
+FINGERPRINT_BITS = 1024
+FINGERPRINT_RADIUS = 2
+
+_morgan_generator = rdFingerprintGenerator.GetMorganGenerator(radius=FINGERPRINT_RADIUS, fpSize=FINGERPRINT_BITS)
+
+# Tokens that could be SMILES: only SMILES characters, and some structure
+# (a bond, branch, ring closure or bracket atom) so plain words like "CO" or
+# "No" are not taken for molecules.
+SMILES_TOKEN_RE = re.compile(r"[A-Za-z0-9@+\-\[\]\(\)=#$/\\%.:]{4,}")
+SMILES_STRUCTURE_RE = re.compile(r"[=#\(\)\[\]@]|\d")
+MIN_HEAVY_ATOMS = 3
+
+# Parsed SMILES remembered per process, valid or not
+SMILES_CACHE_SIZE = int(os.getenv("SMILES_CACHE_SIZE", "100000"))
+# Below this many uncached SMILES a process pool costs more than it saves
+PARALLEL_MIN_BATCH = 2000
+
+
+class MoleculeRecord(NamedTuple):
+    smiles: str  # canonical
+    inchikey: str
+    fingerprint: bytes  # packed Morgan bits
+
+
+class CanonicalSmiles(NamedTuple):
+    smiles: str  # RDKit canonical
+    inchikey: str  # empty for the rare structures InChI cannot represent
+    heavy_atoms: int
+
+
+class _SmilesCache:
+    """
+    LRU of input string -> CanonicalSmiles (or None for strings that do not
+    parse). Shared by request handlers and model threads, hence the lock.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Optional[CanonicalSmiles]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, smiles: str) -> Tuple[bool, Optional[CanonicalSmiles]]:
+        with self._lock:
+            if smiles not in self._entries:
+                return False, None
+            self._entries.move_to_end(smiles)
+            return True, self._entries[smiles]
+
+    def put(self, smiles: str, record: Optional[CanonicalSmiles]) -> None:
+        with self._lock:
+            self._entries[smiles] = record
+            self._entries.move_to_end(smiles)
+            # Canonical SMILES are fed back in by later stages
+            if record is not None and record.smiles != smiles:
+                self._entries[record.smiles] = record
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_smiles_cache = _SmilesCache(SMILES_CACHE_SIZE)
+
+
+def _canonicalize_uncached(smiles: str) -> Optional[CanonicalSmiles]:
+    try:
+        mol = Chem.MolFromSmiles(smiles)
+        if mol is None:
+            return None
+        return CanonicalSmiles(Chem.MolToSmiles(mol), Chem.MolToInchiKey(mol) or "", mol.GetNumHeavyAtoms())
+    except Exception:
+        return None
+
+
+def canonicalize_batch(smiles_list: Iterable[str], processes: int = 0) -> List[Optional[CanonicalSmiles]]:
+    """
+    Canonical SMILES and InChIKey for each input, None where it does not
+    parse. Each distinct string is parsed at most once per process; with
+    `processes` > 1, large batches of unseen strings are parsed in a
+    process pool.
     """
-    Validates a string as a SMILES representation using RDKit.
-    Returns True if the string is a valid SMILES, False otherwise.
+    smiles_list = list(smiles_list)
+    results = {}
+    todo = []
+    for smiles in dict.fromkeys(smiles_list):
+        found, record = _smiles_cache.get(smiles)
+        record_cache_lookup("smiles", found)
+        if found:
+            results[smiles] = record
+        else:
+            todo.append(smiles)
+
+    if todo:
+        if processes > 1 and len(todo) >= PARALLEL_MIN_BATCH:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                computed = list(pool.map(_canonicalize_uncached, todo, chunksize=max(1, len(todo) // (processes * 4))))
+        else:
+            computed = [_canonicalize_uncached(smiles) for smiles in todo]
+        for smiles, record in zip(todo, computed):
+            _smiles_cache.put(smiles, record)
+            results[smiles] = record
+
+    return [results[smiles] for smiles in smiles_list]
+
+
+def canonicalize(smiles: str) -> Optional[CanonicalSmiles]:
+    """
+    Single-string canonicalize_batch.
+    """
+    return canonicalize_batch([smiles])[0]
+
+
+def parse_smiles_lines(lines: Iterable[str]) -> Iterator[str]:
+    """
+    SMILES of a .smi or single-column CSV file, one molecule per line with
+    the SMILES first. Blank lines, comments and a "smiles" header are
+    skipped.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        token = re.split(r"[\s,;]", line, maxsplit=1)[0]
+        if token.lower() != "smiles":
+            yield token
+
+
+def fingerprint_bytes(mol: Chem.Mol) -> bytes:
+    """
+    Morgan fingerprint of a molecule as a packed bitset (FINGERPRINT_BITS / 8 bytes).
+    """
+    bits = np.zeros((FINGERPRINT_BITS,), dtype=np.uint8)
+    DataStructs.ConvertToNumpyArray(_morgan_generator.GetFingerprint(mol), bits)
+    return np.packbits(bits).tobytes()
+
+
+def molecule_fingerprint(smiles: str) -> Optional[bytes]:
+    """
+    Packed Morgan fingerprint of a SMILES, or None if it does not parse.
     """
     try:
         mol = Chem.MolFromSmiles(smiles)
-        return mol is not None
-    except:
-        return False
\ No newline at end of file
+        return fingerprint_bytes(mol) if mol is not None else None
+    except Exception:
+        return None
+
+
+def describe_molecule(smiles: str) -> Optional[MoleculeRecord]:
+    """
+    Parses a SMILES and returns its canonical SMILES, InChIKey and packed
+    fingerprint, or None if it is not a valid molecule.
+    """
+    record = canonicalize(smiles)
+    if record is None or not record.inchikey:
+        return None
+    fingerprint = molecule_fingerprint(record.smiles)
+    if fingerprint is None:
+        return None
+    return MoleculeRecord(record.smiles, record.inchikey, fingerprint)
+
+
+def find_smiles_in_text(text: str) -> List[str]:
+    """
+    Returns the tokens of free text that parse as molecules of at least
+    MIN_HEAVY_ATOMS heavy atoms, in order of appearance, without duplicates.
+    """
+    tokens = []
+    for match in SMILES_TOKEN_RE.finditer(text):
+        token = match.group(0).strip(".:")
+        if SMILES_STRUCTURE_RE.search(token):
+            tokens.append(token)
+    tokens = list(dict.fromkeys(tokens))
+    return [
+        token for token, record in zip(tokens, canonicalize_batch(tokens))
+        if record is not None and record.heavy_atoms >= MIN_HEAVY_ATOMS
+    ]
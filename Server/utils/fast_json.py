@@ -0,0 +1,92 @@
+from typing import Any, AsyncIterator, Dict, Iterable, Optional
+
+import orjson
+
+from models.pydantic_models import MessageModel
+
+# Field order of the response, same as MessageModel(...).dict()
+MESSAGE_FIELDS = tuple(MessageModel.model_fields)
+MESSAGE_DEFAULTS = {"ml_activated": False, "parameters": None}
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Encodes to compact UTF-8 JSON. Naive datetimes come out in isoformat,
+    which is what FastAPI's encoder produces for them.
+    """
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
+def validate_message_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs a stored message through MessageModel, so schema drift fails loudly
+    instead of leaking odd documents to clients. Returns the document
+    unchanged; raises pydantic.ValidationError.
+    """
+    MessageModel.model_validate(doc)
+    return doc
+
+
+async def validate_message_stream(docs: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Validates the first document before returning, i.e. before a streaming
+    response has sent its 200, so drift in it (or a failing query) is
+    answered with an error status. Later documents are validated as they
+    are streamed; one that fails ends the stream early, after the documents
+    before it, and the client gets a body that is not complete JSON (or
+    NDJSON without its final newline).
+    """
+    first = await anext(docs, None)
+    if first is not None:
+        validate_message_document(first)
+
+    async def rest():
+        if first is None:
+            return
+        yield first
+        async for doc in docs:
+            yield validate_message_document(doc)
+
+    return rest()
+
+
+def normalize_message_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Gives a projected message document the exact shape of MessageModel.dict():
+    same keys, same order, defaults for fields older documents lack.
+    """
+    if tuple(doc) == MESSAGE_FIELDS:
+        return doc
+    return {field: doc.get(field, MESSAGE_DEFAULTS.get(field)) for field in MESSAGE_FIELDS}
+
+
+def encode_messages(docs: Iterable[Dict[str, Any]], extra: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Encodes {"messages": [...], **extra} from raw message documents in a
+    single pass, validating each of them.
+    """
+    body = {"messages": [normalize_message_document(validate_message_document(doc)) for doc in docs]}
+    if extra:
+        body.update(extra)
+    return dumps(body)
+
+
+async def stream_messages(docs: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """
+    Streams {"messages": [...]} document by document, so the full history is
+    never held in memory. Expects documents from validate_message_stream.
+    """
+    yield b'{"messages":['
+    first = True
+    async for doc in docs:
+        if first:
+            yield dumps(normalize_message_document(doc))
+            first = False
+        else:
+            yield b"," + dumps(normalize_message_document(doc))
+    yield b"]}"
+
+
+async def stream_messages_ndjson(docs: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    async for doc in docs:
+        yield dumps(normalize_message_document(doc)) + b"\n"
@@ -0,0 +1,151 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest
+)
+
+logger = logging.getLogger(__name__)
+
+# Stages range from sub-millisecond cache lookups to 30 s browser scrapes
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+REQUEST_LATENCY = Histogram(
+    "drug_discovery_request_seconds",
+    "End-to-end HTTP request latency.",
+    ["method", "route", "status"],
+    buckets=STAGE_BUCKETS
+)
+
+STAGE_LATENCY = Histogram(
+    "drug_discovery_stage_seconds",
+    "Latency of individual processing stages (database calls, LLM calls, model runs).",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+
+STAGE_ERRORS = Counter(
+    "drug_discovery_stage_errors_total",
+    "Stages that ended with an exception.",
+    ["stage"]
+)
+
+MODEL_LOAD_SECONDS = Histogram(
+    "drug_discovery_model_load_seconds",
+    "Time spent loading models into memory.",
+    ["model"],
+    buckets=STAGE_BUCKETS
+)
+
+CACHE_REQUESTS = Counter(
+    "drug_discovery_cache_requests_total",
+    "Cache lookups by cache name and result (hit / miss).",
+    ["cache", "result"]
+)
+
+QUEUE_DEPTH = Gauge(
+    "drug_discovery_queue_depth",
+    "Number of callers waiting in an internal queue.",
+    ["queue"]
+)
+
+QUEUE_ACTIVE = Gauge(
+    "drug_discovery_queue_active",
+    "Number of jobs currently holding a slot of an internal queue.",
+    ["queue"]
+)
+
+POOL_WAIT_SECONDS = Histogram(
+    "drug_discovery_pool_wait_seconds",
+    "Time blocking jobs waited for a worker of an executor pool.",
+    ["pool"],
+    buckets=STAGE_BUCKETS
+)
+
+POOL_SATURATION = Gauge(
+    "drug_discovery_pool_saturation",
+    "Fraction of an executor pool's workers that are busy.",
+    ["pool"]
+)
+
+SESSION_EVICTIONS = Counter(
+    "drug_discovery_session_evictions_total",
+    "Sessions dropped from memory, by reason (idle, capacity, memory).",
+    ["reason"]
+)
+
+SESSIONS_ACTIVE = Gauge(
+    "drug_discovery_sessions_active",
+    "Sessions currently held in memory."
+)
+
+SESSIONS_BYTES = Gauge(
+    "drug_discovery_sessions_bytes",
+    "Approximate memory held by in-memory sessions."
+)
+
+ADMISSION_REJECTIONS = Counter(
+    "drug_discovery_admission_rejections_total",
+    "Expensive requests turned away with 429, by task and reason (queue_full, user_limit, deadline).",
+    ["task", "reason"]
+)
+
+ADMISSION_WAIT_SECONDS = Histogram(
+    "drug_discovery_admission_wait_seconds",
+    "Time admitted requests waited in an admission queue.",
+    ["task"],
+    buckets=STAGE_BUCKETS
+)
+
+
+@contextmanager
+def track_stage(stage: str):
+    """
+    Times the wrapped block and records it under the given stage name.
+    Works inside both sync and async functions.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage).observe(elapsed)
+        logger.debug("stage=%s duration_ms=%.1f", stage, elapsed * 1000)
+
+
+@contextmanager
+def track_model_load(model: str):
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    MODEL_LOAD_SECONDS.labels(model).observe(elapsed)
+    logger.info("Loaded %s in %.2fs", model, elapsed)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def register_queue(name: str, depth_fn, active_fn=None) -> None:
+    """
+    Exposes a queue's depth (and optionally its active count) as gauges that
+    are read at scrape time.
+    """
+    QUEUE_DEPTH.labels(name).set_function(depth_fn)
+    if active_fn is not None:
+        QUEUE_ACTIVE.labels(name).set_function(active_fn)
+
+
+def render_metrics():
+    """
+    Returns the Prometheus exposition payload and its content type.
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
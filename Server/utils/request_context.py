@@ -0,0 +1,37 @@
+import logging
+import os
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Stamps every log record with the id of the request being served.
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """
+    Reuses a client/proxy supplied id when present, otherwise makes one.
+    """
+    if incoming and len(incoming) <= 128:
+        return incoming
+    return uuid.uuid4().hex
+
+
+def configure_logging(level: Optional[str] = None) -> None:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level or os.getenv("LOG_LEVEL", "INFO"))